@@ -0,0 +1,53 @@
+"""money in cents
+
+Revision ID: 3c8a5f2e9d71
+Revises: e7b3c9a15d24
+Create Date: 2026-10-18 19:42:11.305817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8a5f2e9d71'
+down_revision: Union[str, Sequence[str], None] = 'e7b3c9a15d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, float column in dollars, integer column in cents)
+MONEY_COLUMNS = (
+    ('products', 'price', 'price_cents'),
+    ('orders', 'total_amount', 'total_cents'),
+    ('order_items', 'price_at_purchase', 'price_at_purchase_cents'),
+    ('order_daily_stats', 'revenue', 'revenue_cents'),
+    ('product_daily_sales', 'revenue', 'revenue_cents'),
+)
+
+
+def _convert(table, old, new, new_type, expression):
+    """Add ``new``, fill it from ``old`` with ``expression`` and drop ``old``"""
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.add_column(sa.Column(new, new_type, nullable=True))
+    op.execute(f'UPDATE {table} SET {new} = {expression}')
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.alter_column(new, existing_type=new_type, nullable=False)
+        batch_op.drop_column(old)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Floats such as 29.99 are stored as 29.989999..., so round to the
+    # nearest cent rather than truncating
+    for table, dollars, cents in MONEY_COLUMNS:
+        _convert(
+            table, dollars, cents, sa.BigInteger(), f'CAST(ROUND({dollars} * 100) AS BIGINT)'
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, dollars, cents in reversed(MONEY_COLUMNS):
+        _convert(table, cents, dollars, sa.Float(), f'{cents} / 100.0')
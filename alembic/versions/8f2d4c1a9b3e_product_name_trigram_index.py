@@ -0,0 +1,41 @@
+"""product name trigram index
+
+Revision ID: 8f2d4c1a9b3e
+Revises: 37dbc08b05c3
+Create Date: 2026-10-18 09:12:41.318604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d4c1a9b3e'
+down_revision: Union[str, Sequence[str], None] = '37dbc08b05c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # pg_trgm only exists on PostgreSQL; other databases use the in-process
+    # n-gram index in app/search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_products_name_trgm',
+        'products',
+        ['name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_products_name_trgm', table_name='products')
@@ -0,0 +1,67 @@
+"""shard order rollups
+
+Revision ID: b5d2e8a4c6f3
+Revises: 3c8a5f2e9d71
+Create Date: 2026-10-18 21:14:52.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d2e8a4c6f3'
+down_revision: Union[str, Sequence[str], None] = '3c8a5f2e9d71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, primary key without the shard, summed columns)
+ROLLUPS = (
+    ('order_daily_stats', ['day', 'status'], ['orders', 'revenue_cents']),
+    ('product_daily_sales', ['day', 'product_id'], ['units', 'revenue_cents']),
+)
+
+
+def _replace_primary_key(batch_op, table, columns):
+    # SQLite's primary keys are unnamed; batch mode replaces it when the
+    # table is recreated
+    if op.get_bind().dialect.name != 'sqlite':
+        batch_op.drop_constraint(f'{table}_pkey', type_='primary')
+    batch_op.create_primary_key(f'{table}_pkey', columns)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows all become shard 0
+    for table, key, _ in ROLLUPS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column('shard', sa.Integer(), nullable=False, server_default='0')
+            )
+            _replace_primary_key(batch_op, table, [*key, 'shard'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, key, values in ROLLUPS:
+        # Fold each key's shards into its shard 0 row, adding one if missing
+        columns, summed = ', '.join(key), ', '.join(values)
+        zeros = ', '.join('0' for _ in values)
+        op.execute(
+            f'INSERT INTO {table} ({columns}, shard, {summed}) '
+            f'SELECT {columns}, 0, {zeros} FROM {table} '
+            f'GROUP BY {columns} HAVING min(shard) > 0'
+        )
+        same_key = ' AND '.join(f'shards.{column} = {table}.{column}' for column in key)
+        sums = ', '.join(
+            f'{value} = (SELECT sum(shards.{value}) FROM {table} AS shards WHERE {same_key})'
+            for value in values
+        )
+        op.execute(f'UPDATE {table} SET {sums} WHERE shard = 0')
+        op.execute(f'DELETE FROM {table} WHERE shard != 0')
+
+        with op.batch_alter_table(table) as batch_op:
+            _replace_primary_key(batch_op, table, key)
+            batch_op.drop_column('shard')
@@ -0,0 +1,35 @@
+"""product low stock partial index
+
+Revision ID: c41e7a2d5f60
+Revises: 8f2d4c1a9b3e
+Create Date: 2026-10-18 14:03:27.550912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7a2d5f60'
+down_revision: Union[str, Sequence[str], None] = '8f2d4c1a9b3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_products_low_stock',
+        'products',
+        ['id'],
+        unique=False,
+        postgresql_where=sa.text('stock <= low_stock_threshold'),
+        sqlite_where=sa.text('stock <= low_stock_threshold'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_low_stock', table_name='products')
@@ -0,0 +1,54 @@
+"""order filter indexes
+
+Revision ID: e7b3c9a15d24
+Revises: 9a6d1e4b7c35
+Create Date: 2026-10-18 18:05:37.912460
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3c9a15d24'
+down_revision: Union[str, Sequence[str], None] = '9a6d1e4b7c35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Order listings and filter_orders page through (order_date, id),
+    # optionally for one status
+    op.create_index('ix_orders_order_date_id', 'orders', ['order_date', 'id'], unique=False)
+    op.create_index(
+        'ix_orders_status_order_date_id', 'orders', ['status', 'order_date', 'id'], unique=False
+    )
+    # Items are looked up by order (listings, get_order, cancellation) and
+    # by product (stock locks on cancellation, product deletes)
+    op.create_index(op.f('ix_order_items_order_id'), 'order_items', ['order_id'], unique=False)
+    op.create_index(op.f('ix_order_items_product_id'), 'order_items', ['product_id'], unique=False)
+
+    # customer_email is filtered with ILIKE '%term%', which only a trigram
+    # index can serve; pg_trgm was installed with the product name index
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index(
+            'ix_orders_customer_email_trgm',
+            'orders',
+            ['customer_email'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'customer_email': 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_orders_customer_email_trgm', table_name='orders')
+    op.drop_index(op.f('ix_order_items_product_id'), table_name='order_items')
+    op.drop_index(op.f('ix_order_items_order_id'), table_name='order_items')
+    op.drop_index('ix_orders_status_order_date_id', table_name='orders')
+    op.drop_index('ix_orders_order_date_id', table_name='orders')
@@ -5,14 +5,12 @@ from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from app import models, schemas
-from app.database import get_db
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.cache import user_cache
+from app.database import get_db, run_db
+from app.passwords import check_password, hash_password
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -21,14 +19,22 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Put the user id and active flag in tokens so write endpoints can authorize
+# without loading the user. A deactivated user's existing tokens then stay
+# valid until they expire.
+TOKEN_USER_CLAIMS = os.getenv("TOKEN_USER_CLAIMS", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return check_password(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return hash_password(password)
 
 
 # Create a JWT access token
@@ -43,34 +49,80 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
+def token_claims(user) -> dict:
+    """Claims for a user's access token"""
+    claims = {"sub": user.username}
+    if TOKEN_USER_CLAIMS:
+        claims.update({"uid": user.id, "active": user.is_active})
+    return claims
+
+
+def _get_user(db: Session, username: str):
+    return db.query(models.User).filter(models.User.username == username).first()
+
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
 
-    user = (
-        db.query(models.User)
-        .filter(models.User.username == token_data.username)
-        .first()
-    )
-    if user is None:
-        raise credentials_exception
-    return user
 
+async def _load_user(db, username: str) -> schemas.User:
+    """Look a user up by username, going through the user cache"""
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+
+    version = user_cache.version(username)
+    db_user = await run_db(db, _get_user, username)
+    if db_user is None:
+        raise _credentials_exception()
+    user_cache.set(db_user, version)
+    return schemas.User.model_validate(db_user, from_attributes=True)
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
+    payload = _decode_token(token)
+    token_data = schemas.TokenData(username=payload["sub"])
+    return await _load_user(db, token_data.username)
+
+
+async def get_current_active_user(
+    current_user: schemas.User = Depends(get_current_user),
+):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def get_active_principal(
+    token: str = Depends(oauth2_scheme), db=Depends(get_db)
+) -> schemas.Principal:
+    """The active caller, read from token claims when they are present.
+
+    Endpoints that only need to know who is calling use this instead of
+    ``get_current_active_user`` so tokens with user claims skip the lookup.
+    """
+    payload = _decode_token(token)
+    if TOKEN_USER_CLAIMS and "uid" in payload and "active" in payload:
+        principal = schemas.Principal(
+            id=payload["uid"], username=payload["sub"], is_active=payload["active"]
+        )
+    else:
+        principal = await _load_user(db, payload["sub"])
+
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
@@ -0,0 +1,229 @@
+"""Read-through caching for rows that are read far more often than written.
+
+Backends store strings under string keys with a TTL, so anything with
+Redis-like get/set/delete semantics can stand in for the in-process LRU.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+from app import schemas
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[str]: ...
+
+    def set(self, key: str, value: str, ttl: float) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class LRUCache:
+    """In-process cache that evicts the least recently used entry when full"""
+
+    def __init__(self, max_size: int, clock=time.monotonic):
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Backend for any redis-py compatible client (get, set with ex=, delete)"""
+
+    def __init__(self, client, prefix: str = "syncstock:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            return value.decode()
+        return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.client.set(self.prefix + key, value, ex=max(1, round(ttl)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class SchemaCache:
+    """Caches rows as serialized pydantic schemas, keyed by one attribute.
+
+    ``invalidate`` gives a key a new version. A read-through miss takes the
+    version before reading the row and passes it to ``set``, which skips
+    the write if the key was invalidated in between, so a write committed
+    during the read cannot be hidden behind the stale row for a whole TTL.
+
+    Versions are stored in the backend next to the values, so they are
+    bounded like the values are. Each version is a fresh random token, never
+    a counter, and one is stored when a read finds none, so a version that
+    was evicted or expired since it was taken can never match again.
+    """
+
+    def __init__(
+        self,
+        schema,
+        namespace: str,
+        key_attr: str,
+        backend: Optional[CacheBackend],
+        ttl: float,
+    ):
+        self.schema = schema
+        self.namespace = namespace
+        self.key_attr = key_attr
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        value = self.backend.get(self._key(key))
+        # Lookups run in threadpool workers; += on an attribute is not atomic
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            return None
+        return self.schema.model_validate_json(value)
+
+    def version(self, key) -> str:
+        """Take before reading the row that will be passed to ``set``"""
+        if self.backend is None:
+            return ""
+        with self._lock:
+            version = self.backend.get(self._version_key(key))
+            if version is None:
+                version = self._new_version(key)
+            return version
+
+    def set(self, row, version: str = None) -> None:
+        """Cache ``row``, unless ``version`` is given and its key has been
+        invalidated since that version was taken"""
+        if self.backend is None:
+            return
+        cached = self.schema.model_validate(row, from_attributes=True)
+        key = getattr(cached, self.key_attr)
+        value = cached.model_dump_json()
+        with self._lock:
+            if (
+                version is not None
+                and self.backend.get(self._version_key(key)) != version
+            ):
+                return
+            self.backend.set(self._key(key), value, self.ttl)
+
+    def invalidate(self, *keys) -> None:
+        if self.backend is None:
+            return
+        with self._lock:
+            for key in keys:
+                self._new_version(key)
+                self.backend.delete(self._key(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.hits = self.misses = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        stats = {
+            "enabled": self.backend is not None,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "ttl_seconds": self.ttl,
+        }
+        if isinstance(self.backend, LRUCache):
+            stats["size"] = len(self.backend)
+            stats["max_size"] = self.backend.max_size
+        return stats
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _new_version(self, key) -> str:
+        version = uuid.uuid4().hex
+        self.backend.set(self._version_key(key), version, self.ttl)
+        return version
+
+    def _version_key(self, key) -> str:
+        return f"{self.namespace}-version:{key}"
+
+
+def _lru(size: int) -> Optional[LRUCache]:
+    return LRUCache(size) if size > 0 else None
+
+
+product_cache = SchemaCache(
+    schemas.Product,
+    "product",
+    "id",
+    _lru(PRODUCT_CACHE_SIZE),
+    ttl=PRODUCT_CACHE_TTL,
+)
+
+# Authenticated users by token subject; kept short so deactivations made by
+# other processes still take effect quickly
+user_cache = SchemaCache(
+    schemas.User,
+    "user",
+    "username",
+    _lru(USER_CACHE_SIZE),
+    ttl=USER_CACHE_TTL,
+)
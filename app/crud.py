@@ -1,7 +1,63 @@
-from sqlalchemy.orm import Session, joinedload
+import hashlib
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import (
+    Date,
+    Float,
+    Integer,
+    and_,
+    case,
+    cast,
+    column,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 from app import models, schemas
 from app.auth import get_password_hash, verify_password
+from app.cache import product_cache, user_cache
+from app.events import stock_events
+from app.money import from_cents, to_cents
+from app.search import RANK_SCALE, product_index
+
+# Candidate ids checked per query when paging through n-gram index matches
+SEARCH_CHUNK_SIZE = 500
+# Products per stock adjustment statement; at three bind parameters a row
+# this stays under SQLite's 32766 parameter limit
+STOCK_ADJUSTMENT_CHUNK_SIZE = 10000
+# How long an Idempotency-Key and its response are kept
+IDEMPOTENCY_KEY_TTL = timedelta(
+    hours=float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+)
+# Expired keys are purged by order creation at most this often (seconds)
+IDEMPOTENCY_PURGE_INTERVAL = 60.0
+# Rows per rollup key; each order transaction adds to one picked at random,
+# so concurrent orders on the same day rarely wait on one row's lock
+ROLLUP_SHARDS = 16
+
+_next_idempotency_purge = 0.0
+
+
+class IdempotencyKeyReused(Exception):
+    """The Idempotency-Key was already used for a different request"""
+
+
+class IdempotencyKeyInProgress(Exception):
+    """Another request with the same Idempotency-Key has not finished"""
 
 
 def get_user_by_email(db: Session, email: str):
@@ -12,8 +68,9 @@ def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         email=user.email, username=user.username, hashed_password=hashed_password
     )
@@ -23,6 +80,19 @@ def create_user(db: Session, user: schemas.UserCreate):
     return db_user
 
 
+def set_user_active(db: Session, username: str, is_active: bool):
+    db_user = get_user_by_username(db, username)
+
+    if db_user is None:
+        return None
+
+    db_user.is_active = is_active
+    db.commit()
+    db.refresh(db_user)
+    user_cache.invalidate(username)
+    return db_user
+
+
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
@@ -32,12 +102,73 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
-def get_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Product).offset(skip).limit(limit).all()
+def _dollars(cents_column, name: str):
+    """An integer cents column as a float number of dollars, for JSON output.
+
+    Dividing exact integers gives the float nearest the true amount, whose
+    shortest repr is the amount itself (2999 -> 29.99).
+    """
+    return (cast(cents_column, Float) / 100).label(name)
+
+
+# Columns read by the listings, which return plain dicts instead of ORM
+# objects so responses can be encoded without hydration or validation
+PRODUCT_COLUMNS = (
+    models.Product.id,
+    models.Product.name,
+    _dollars(models.Product.price_cents, "price"),
+    models.Product.stock,
+    models.Product.low_stock_threshold,
+)
+ORDER_COLUMNS = (
+    models.Order.id,
+    models.Order.customer_name,
+    models.Order.customer_email,
+    models.Order.customer_phone,
+    models.Order.customer_address,
+    models.Order.order_date,
+    models.Order.status,
+    _dollars(models.Order.total_cents, "total_amount"),
+)
+ORDER_ITEM_COLUMNS = (
+    models.OrderItem.id,
+    models.OrderItem.order_id,
+    models.OrderItem.product_id,
+    models.OrderItem.quantity,
+    _dollars(models.OrderItem.price_at_purchase_cents, "price_at_purchase"),
+)
+
+
+def _as_dicts(rows):
+    return [row._asdict() for row in rows]
+
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    query = db.query(*PRODUCT_COLUMNS).order_by(models.Product.id)
+
+    if after_id is not None:
+        query = query.filter(models.Product.id > after_id)
+
+    return _as_dicts(query.offset(skip).limit(limit))
 
 
 def get_product(db: Session, product_id: int):
-    return db.query(models.Product).filter(models.Product.id == product_id).first()
+    """Read a product through the product cache, as a ``schemas.Product``"""
+    cached = product_cache.get(product_id)
+    if cached is not None:
+        return cached
+
+    # A stock change committed while the row is read bumps the version, and
+    # the stale row is then not cached
+    version = product_cache.version(product_id)
+    db_product = (
+        db.query(models.Product).filter(models.Product.id == product_id).first()
+    )
+    if db_product is None:
+        return None
+
+    product_cache.set(db_product, version)
+    return schemas.Product.model_validate(db_product, from_attributes=True)
 
 
 def create_product(db: Session, product: schemas.ProductCreate):
@@ -49,8 +180,12 @@ def create_product(db: Session, product: schemas.ProductCreate):
     )
 
     db.add(db_product)
+    db.flush()
+    version = product_cache.version(db_product.id)
     db.commit()
     db.refresh(db_product)
+    product_index.add(db_product.id, db_product.name)
+    product_cache.set(db_product, version)
     return db_product
 
 
@@ -62,6 +197,8 @@ def update_product(db: Session, product_id: int, product_update: schemas.Product
     if db_product is None:
         return None
 
+    old_stock, old_threshold = db_product.stock, db_product.low_stock_threshold
+
     if product_update.name is not None:
         db_product.name = product_update.name
     if product_update.price is not None:
@@ -71,8 +208,22 @@ def update_product(db: Session, product_id: int, product_update: schemas.Product
     if product_update.low_stock_threshold is not None:
         db_product.low_stock_threshold = product_update.low_stock_threshold
 
+    version = product_cache.version(product_id)
     db.commit()
     db.refresh(db_product)
+    product_index.add(db_product.id, db_product.name)
+    product_cache.set(db_product, version)
+    _publish_crossings(
+        [
+            (
+                db_product.id,
+                old_stock,
+                old_threshold,
+                db_product.stock,
+                db_product.low_stock_threshold,
+            )
+        ]
+    )
     return db_product
 
 
@@ -86,9 +237,199 @@ def delete_product(db: Session, product_id: int):
 
     db.delete(db_product)
     db.commit()
+    product_index.remove(product_id)
+    product_cache.invalidate(product_id)
     return db_product
 
 
+def upsert_products(db: Session, products: list):
+    """Insert or update a chunk of products by name in one transaction.
+
+    Every existing product with a matching name is updated; new names are
+    written with a multi-row INSERT. When a name repeats within the chunk,
+    the last row wins. Returns (inserted, updated) counts.
+    """
+    rows = {}
+    for product in products:
+        row = product.model_dump()
+        row["price_cents"] = to_cents(row.pop("price"))
+        rows[product.name] = row
+
+    existing = (
+        db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.stock,
+            models.Product.low_stock_threshold,
+        )
+        .filter(models.Product.name.in_(list(rows)))
+        .all()
+    )
+    updates = [{"id": row.id, **rows[row.name]} for row in existing]
+    existing_names = {row.name for row in existing}
+    inserts = [row for name, row in rows.items() if name not in existing_names]
+
+    inserted = []
+    if inserts:
+        inserted = db.execute(
+            insert(models.Product).returning(models.Product.id, models.Product.name),
+            inserts,
+        ).all()
+    if updates:
+        db.execute(update(models.Product), updates)
+    db.commit()
+
+    for product_id, name in inserted:
+        product_index.add(product_id, name)
+    for row in updates:
+        product_index.add(row["id"], row["name"])
+    product_cache.invalidate(*(row["id"] for row in updates))
+    _publish_crossings(
+        (
+            row.id,
+            row.stock,
+            row.low_stock_threshold,
+            rows[row.name]["stock"],
+            rows[row.name]["low_stock_threshold"],
+        )
+        for row in existing
+    )
+
+    return len(inserted), len(updates)
+
+
+def _stock_crossing(old_stock, old_threshold, new_stock, new_threshold):
+    """Name the crossing when a change moved a product across its threshold"""
+    was_low = old_stock <= old_threshold
+    is_low = new_stock <= new_threshold
+    if is_low and not was_low:
+        return "low_stock"
+    if was_low and not is_low:
+        return "restocked"
+    return None
+
+
+def _publish_crossings(changes):
+    """Publish a stock event for every change that crossed a threshold.
+
+    ``changes`` holds (product_id, old_stock, old_threshold, new_stock,
+    new_threshold) tuples. Call only after the commit, so subscribers never
+    hear about a change that was rolled back. Returns the published events.
+    """
+    events = []
+    for product_id, old_stock, old_threshold, new_stock, new_threshold in changes:
+        crossing = _stock_crossing(old_stock, old_threshold, new_stock, new_threshold)
+        if crossing is None:
+            continue
+        event = schemas.StockEvent(
+            event=crossing,
+            product_id=product_id,
+            stock=new_stock,
+            low_stock_threshold=new_threshold,
+        )
+        stock_events.publish(event)
+        events.append(event)
+    return events
+
+
+def adjust_stock(db: Session, adjustments: list):
+    """Apply stock deltas and absolute levels to many products at once.
+
+    Entries for the same product apply in order. The products are locked
+    with one query and changed with one ``UPDATE ... FROM (VALUES ...)``
+    statement per 10000 products, all in one transaction. Raises ValueError,
+    changing nothing, if a product is missing or would go below zero.
+    """
+    # Fold each product's entries into new stock = stock * keep + amount,
+    # where keep drops to 0 once an absolute level has been set
+    changes = {}
+    for adjustment in adjustments:
+        keep, amount = changes.get(adjustment.product_id, (1, 0))
+        if adjustment.absolute is not None:
+            keep, amount = 0, adjustment.absolute
+        else:
+            amount += adjustment.delta
+        changes[adjustment.product_id] = (keep, amount)
+
+    product_ids = sorted(changes)
+    chunks = [
+        product_ids[start : start + STOCK_ADJUSTMENT_CHUNK_SIZE]
+        for start in range(0, len(product_ids), STOCK_ADJUSTMENT_CHUNK_SIZE)
+    ]
+
+    # Locked in ascending id order, like _lock_products
+    old_stock = {}
+    for chunk in chunks:
+        old_stock.update(
+            db.query(models.Product.id, models.Product.stock)
+            .filter(models.Product.id.in_(chunk))
+            .order_by(models.Product.id)
+            .with_for_update()
+            .all()
+        )
+
+    for product_id in product_ids:
+        if product_id not in old_stock:
+            db.rollback()
+            raise ValueError(f"Product with id {product_id} not found")
+        keep, amount = changes[product_id]
+        if old_stock[product_id] * keep + amount < 0:
+            db.rollback()
+            raise ValueError(
+                f"Stock for product {product_id} cannot go below 0. "
+                f"Available: {old_stock[product_id]}"
+            )
+
+    rows = []
+    for chunk in chunks:
+        adjusted = (
+            values(
+                column("id", Integer),
+                column("keep", Integer),
+                column("amount", Integer),
+                name="adjustments",
+            )
+            .data([(product_id, *changes[product_id]) for product_id in chunk])
+            .cte("adjustments")
+        )
+        new_stock = models.Product.stock * adjusted.c.keep + adjusted.c.amount
+        result = db.execute(
+            update(models.Product)
+            .where(models.Product.id == adjusted.c.id, new_stock >= 0)
+            .values(stock=new_stock)
+            .returning(
+                models.Product.id,
+                models.Product.stock,
+                models.Product.low_stock_threshold,
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        if len(result) != len(chunk):
+            # Stock moved underneath us (databases without row locks)
+            db.rollback()
+            raise ValueError("Stock changed concurrently; no adjustments were applied")
+        rows.extend(result)
+
+    db.commit()
+    product_cache.invalidate(*product_ids)
+
+    rows.sort()
+    events = _publish_crossings(
+        (product_id, old_stock[product_id], threshold, stock, threshold)
+        for product_id, stock, threshold in rows
+    )
+    return schemas.StockAdjustmentResult(
+        products=[
+            schemas.StockLevel(
+                product_id=product_id, stock=stock, low_stock_threshold=threshold
+            )
+            for product_id, stock, threshold in rows
+        ],
+        low_stock=[e.product_id for e in events if e.event == "low_stock"],
+        restocked=[e.product_id for e in events if e.event == "restocked"],
+    )
+
+
 # SEARCHING
 def search_products(
     db: Session,
@@ -98,22 +439,86 @@ def search_products(
     in_stock_only: bool = False,
     skip: int = 0,
     limit: int = 100,
+    after: tuple = None,
 ):
-    query = db.query(models.Product)
+    """Search products, best match first when a search term is given.
 
-    if search:
-        query = query.filter(models.Product.name.ilike(f"%{search}%"))
+    ``after`` is the sort key of the last product already seen: ``(id,)``
+    without a search term, ``(search_rank, id)`` with one. Ranked results
+    carry their ``search_rank`` in the product dict.
+    """
+    query = db.query(*PRODUCT_COLUMNS)
 
     if min_price is not None:
-        query = query.filter(models.Product.price >= min_price)
+        query = query.filter(models.Product.price_cents >= to_cents(min_price))
 
     if max_price is not None:
-        query = query.filter(models.Product.price <= max_price)
+        query = query.filter(models.Product.price_cents <= to_cents(max_price))
 
     if in_stock_only:
         query = query.filter(models.Product.stock > 0)
 
-    return query.offset(skip).limit(limit).all()
+    if search:
+        if db.get_bind().dialect.name == "postgresql":
+            return _search_trigram_index(query, search, skip, limit, after)
+        return _search_ngram_index(db, query, search, skip, limit, after)
+
+    query = query.order_by(models.Product.id)
+
+    if after is not None:
+        query = query.filter(models.Product.id > after[0])
+
+    return _as_dicts(query.offset(skip).limit(limit))
+
+
+def _search_trigram_index(query, search, skip, limit, after):
+    """Match and rank in PostgreSQL, using the pg_trgm index on products.name"""
+    relevance = cast(func.similarity(models.Product.name, search) * RANK_SCALE, Integer)
+    query = (
+        query.add_columns(relevance.label("search_rank"))
+        .filter(models.Product.name.ilike(f"%{search}%"))
+        .order_by(relevance.desc(), models.Product.id)
+    )
+
+    if after is not None:
+        rank, product_id = after
+        query = query.filter(
+            or_(
+                relevance < rank,
+                and_(relevance == rank, models.Product.id > product_id),
+            )
+        )
+
+    return _as_dicts(query.offset(skip).limit(limit))
+
+
+def _search_ngram_index(db, query, search, skip, limit, after):
+    """Match and rank in the in-process index, then apply filters in SQL"""
+    product_index.load(db.query(models.Product.id, models.Product.name))
+    matches = product_index.search(search)
+
+    if after is not None:
+        rank, product_id = after
+        matches = [m for m in matches if (-m[0], m[1]) > (-rank, product_id)]
+
+    products = []
+    for start in range(0, len(matches), SEARCH_CHUNK_SIZE):
+        chunk = matches[start : start + SEARCH_CHUNK_SIZE]
+        ids = [product_id for _, product_id in chunk]
+        found = {p.id: p for p in query.filter(models.Product.id.in_(ids))}
+
+        for rank, product_id in chunk:
+            row = found.get(product_id)
+            if row is None:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            products.append({**row._asdict(), "search_rank": rank})
+            if len(products) == limit:
+                return products
+
+    return products
 
 
 def filter_orders(
@@ -122,24 +527,91 @@ def filter_orders(
     customer_email: str = None,
     skip: int = 0,
     limit: int = 100,
+    after: tuple = None,
 ):
-    query = db.query(models.Order).options(joinedload(models.Order.items))
+    query = _order_listing(db, after).filter(*_order_filters(status, customer_email))
+    return _with_items(db, query.offset(skip).limit(limit))
+
+
+def _order_filters(status: str = None, customer_email: str = None):
+    criteria = []
 
     if status:
-        query = query.filter(models.Order.status == status)
+        criteria.append(models.Order.status == status)
 
     if customer_email:
-        query = query.filter(models.Order.customer_email.ilike(f"%{customer_email}%"))
+        criteria.append(models.Order.customer_email.ilike(f"%{customer_email}%"))
+
+    return criteria
+
+
+# EXPORTS
+def product_export_statement():
+    """Every product, by id"""
+    return select(*PRODUCT_COLUMNS).order_by(models.Product.id)
+
 
-    return query.offset(skip).limit(limit).all()
+def order_export_statement(status: str = None, customer_email: str = None):
+    """Orders matching the ``filter_orders`` filters, one row per item.
+
+    Items are joined in rather than fetched per page, so the export is a
+    single statement that can be streamed from a server-side cursor; rows of
+    one order are adjacent and ordered by item id. Orders without items get
+    one row with NULL item columns.
+    """
+    return (
+        select(
+            *ORDER_COLUMNS,
+            models.OrderItem.id.label("item_id"),
+            models.OrderItem.product_id,
+            models.OrderItem.quantity,
+            _dollars(models.OrderItem.price_at_purchase_cents, "price_at_purchase"),
+        )
+        .outerjoin(models.OrderItem, models.OrderItem.order_id == models.Order.id)
+        .where(*_order_filters(status, customer_email))
+        .order_by(models.Order.order_date, models.Order.id, models.OrderItem.id)
+    )
 
 
 # ORDERS
 
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100):
-    query = db.query(models.Order).options(joinedload(models.Order.items))
-    return query.offset(skip).limit(limit).all()
+def _order_listing(db: Session, after: tuple = None):
+    """Order columns sorted by (order_date, id), starting after the ``after`` key"""
+    query = db.query(*ORDER_COLUMNS).order_by(models.Order.order_date, models.Order.id)
+
+    if after is not None:
+        query = query.filter(tuple_(models.Order.order_date, models.Order.id) > after)
+
+    return query
+
+
+def _with_items(db: Session, order_rows):
+    """Order dicts with their items, read in a second query.
+
+    Items are fetched for exactly the ids on the page, so LIMIT applies to
+    orders directly instead of to a subquery, and order columns are not
+    repeated on every item row.
+    """
+    orders = _as_dicts(order_rows)
+    by_id = {}
+    for order in orders:
+        order["items"] = []
+        by_id[order["id"]] = order
+
+    if by_id:
+        items = (
+            db.query(*ORDER_ITEM_COLUMNS)
+            .filter(models.OrderItem.order_id.in_(list(by_id)))
+            .order_by(models.OrderItem.id)
+        )
+        for item in items:
+            by_id[item.order_id]["items"].append(item._asdict())
+    return orders
+
+
+def get_orders(db: Session, skip: int = 0, limit: int = 100, after: tuple = None):
+    return _with_items(db, _order_listing(db, after).offset(skip).limit(limit))
 
 
 def get_order(db: Session, order_id: int):
@@ -151,60 +623,344 @@ def get_order(db: Session, order_id: int):
     )
 
 
-def create_order(db: Session, order: schemas.OrderCreate):
-    total_amount = 0.0  # Start off with no cost
-    product_data = []  # Store the product data in a list
+def _reload_order(db: Session, order_id: int):
+    """Re-read an order with its items after a commit.
 
-    for item in order.items:
-        product = (
-            db.query(models.Product)
-            .filter(models.Product.id == item.product_id)
-            .first()
+    Loading the items up front keeps the returned order serializable when the
+    session no longer allows lazy loads (async mode).
+    """
+    return (
+        db.query(models.Order)
+        .options(joinedload(models.Order.items))
+        .populate_existing()
+        .filter(models.Order.id == order_id)
+        .first()
+    )
+
+
+def _lock_products(db: Session, product_ids):
+    """Load products with a single IN query, row-locked in ascending id order.
+
+    Every writer locks products in the same order, so concurrent orders that
+    share SKUs queue behind each other instead of deadlocking.
+    """
+    return (
+        db.query(models.Product)
+        .filter(models.Product.id.in_(product_ids))
+        .order_by(models.Product.id)
+        .with_for_update()
+        .all()
+    )
+
+
+def _reserve_stock(db: Session, quantities: dict):
+    """Decrement stock for all products in one conditional UPDATE.
+
+    Returns False if any product no longer has enough stock; the caller must
+    roll back because the other rows may already have been decremented.
+    """
+    requested = case(quantities, value=models.Product.id)
+    result = db.execute(
+        update(models.Product)
+        .where(
+            models.Product.id.in_(list(quantities)),
+            models.Product.stock >= requested,
         )
+        .values(stock=models.Product.stock - requested)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
+
+
+def _order_quantities(order: schemas.OrderCreate):
+    """Total quantity per product, in case the same product appears twice"""
+    quantities = {}
+    for item in order.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def _stock_error(quantities: dict, products: dict, reserved: dict):
+    """Why an order cannot be filled, or None if it can.
+
+    ``reserved`` holds units already promised to earlier orders in the same
+    transaction, on top of the locked ``products`` stock.
+    """
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
 
         if product is None:
-            raise ValueError(f"Product with id {item.product_id} not found")
+            return f"Product with id {product_id} not found"
 
-        if product.stock < item.quantity:
-            raise ValueError(
-                f"Insufficient stock for product '{product.name}'. Available: {product.stock}, "
-                f"Requested: {item.quantity}"
+        available = product.stock - reserved.get(product_id, 0)
+        if available < quantity:
+            return (
+                f"Insufficient stock for product '{product.name}'. Available: {available}, "
+                f"Requested: {quantity}"
             )
+    return None
+
+
+def _order_total_cents(order: schemas.OrderCreate, products: dict):
+    total_cents = 0  # Start off with no cost
+    for item in order.items:
+        total_cents += products[item.product_id].price_cents * item.quantity
+    return total_cents
 
-        line_total = product.price * item.quantity
-        total_amount += line_total
 
-        product_data.append(
-            {"product": product, "quantity": item.quantity, "price": product.price}
+def create_order(
+    db: Session,
+    order: schemas.OrderCreate,
+    idempotency_key: models.IdempotencyKey = None,
+):
+    """Reserve stock and create an order in one transaction.
+
+    With ``idempotency_key`` (a pending row added by ``create_order_once``),
+    the serialized order is stored in it in the same transaction and the
+    order is returned as a ``schemas.Order``.
+    """
+    quantities = _order_quantities(order)
+    products = {p.id: p for p in _lock_products(db, list(quantities))}
+
+    error = _stock_error(quantities, products, {})
+    if error:
+        db.rollback()
+        raise ValueError(error)
+
+    total_cents = _order_total_cents(order, products)
+
+    if not _reserve_stock(db, quantities):
+        # Another transaction got there first (databases without row locks)
+        db.rollback()
+        raise ValueError("Insufficient stock for one or more products in the order")
+
+    stock_changes = []
+    for product_id, product in products.items():
+        threshold = product.low_stock_threshold
+        stock_changes.append(
+            (
+                product_id,
+                product.stock,
+                threshold,
+                product.stock - quantities[product_id],
+                threshold,
+            )
         )
+        # The UPDATE bypassed the ORM, so drop the stale in-memory stock value
+        db.expire(product, ["stock"])
 
     db_order = models.Order(
         customer_name=order.customer_name,
         customer_email=order.customer_email,
         customer_phone=order.customer_phone,
         customer_address=order.customer_address,
-        total_amount=total_amount,
+        total_cents=total_cents,
         status="pending",
     )
 
     db.add(db_order)
     db.flush()
+    order_id = db_order.id
+
+    # One executemany for all items, however many there are
+    db.execute(
+        insert(models.OrderItem),
+        [
+            {
+                "order_id": order_id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price_at_purchase_cents": products[item.product_id].price_cents,
+            }
+            for item in order.items
+        ],
+    )
+    _roll_up_orders(db, [order_id])
+
+    created = None
+    if idempotency_key is not None:
+        created = schemas.Order.model_validate(_reload_order(db, order_id))
+        idempotency_key.order_id = order_id
+        idempotency_key.response = created.model_dump_json()
+
+    db.commit()
+    product_cache.invalidate(*quantities)
+    _publish_crossings(stock_changes)
+
+    return created or _reload_order(db, order_id)
+
+
+def _utcnow():
+    # Naive UTC, like the other DateTime columns
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _stored_order(db: Session, user_id: int, key: str, request_hash: str, now):
+    """The order stored for a live idempotency key, or None if there is none"""
+    row = db.get(models.IdempotencyKey, (user_id, key), populate_existing=True)
+
+    if row is None:
+        return None
 
-    for data in product_data:
-        order_item = models.OrderItem(
-            order_id=db_order.id,
-            product_id=data["product"].id,
-            quantity=data["quantity"],
-            price_at_purchase=data["price"],
+    if row.expires_at <= now:
+        db.delete(row)
+        db.flush()
+        return None
+
+    if row.request_hash != request_hash:
+        raise IdempotencyKeyReused()
+
+    if row.response is None:
+        raise IdempotencyKeyInProgress()
+
+    return schemas.Order.model_validate_json(row.response)
+
+
+def _purge_expired_idempotency_keys(db: Session, now):
+    global _next_idempotency_purge
+
+    if time.monotonic() < _next_idempotency_purge:
+        return
+    _next_idempotency_purge = time.monotonic() + IDEMPOTENCY_PURGE_INTERVAL
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.expires_at <= now
+    ).delete(synchronize_session=False)
+
+
+def create_order_once(db: Session, order: schemas.OrderCreate, user_id: int, key: str):
+    """Create an order at most once per (user, Idempotency-Key).
+
+    A retry gets the stored response from a single primary key lookup.
+    The key row is inserted before any stock is touched, so a concurrent
+    retry blocks on it and then replays instead of reserving stock twice.
+    Returns (order, replayed).
+    """
+    request_hash = hashlib.sha256(order.model_dump_json().encode()).hexdigest()
+    now = _utcnow()
+
+    stored = _stored_order(db, user_id, key, request_hash, now)
+    if stored is not None:
+        db.commit()
+        return stored, True
+
+    _purge_expired_idempotency_keys(db, now)
+    pending = models.IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=request_hash,
+        created_at=now,
+        expires_at=now + IDEMPOTENCY_KEY_TTL,
+    )
+    db.add(pending)
+    try:
+        db.flush()
+    except IntegrityError:
+        # A concurrent request with this key committed first
+        db.rollback()
+        stored = _stored_order(db, user_id, key, request_hash, now)
+        if stored is None:
+            raise IdempotencyKeyInProgress()
+        return stored, True
+
+    return create_order(db, order, idempotency_key=pending), False
+
+
+def create_orders(db: Session, orders: list):
+    """Create a batch of orders in one transaction, each all-or-nothing.
+
+    Every referenced product is locked with one query and orders are filled
+    in the given order, so an order that does not fit the stock left by
+    earlier ones fails on its own while the rest go through. Stock for the
+    whole batch is reserved with one UPDATE and orders and items are written
+    with multi-row INSERTs. Returns (order, error) per input, in input order.
+    """
+    quantities = [_order_quantities(order) for order in orders]
+    product_ids = sorted({p for q in quantities for p in q})
+    products = {p.id: p for p in _lock_products(db, product_ids)}
+
+    reserved = {}
+    errors = []
+    for order_quantities in quantities:
+        error = _stock_error(order_quantities, products, reserved)
+        errors.append(error)
+        if error is None:
+            for product_id, quantity in order_quantities.items():
+                reserved[product_id] = reserved.get(product_id, 0) + quantity
+
+    accepted = [i for i, error in enumerate(errors) if error is None]
+    if not accepted:
+        db.rollback()
+        return [(None, error) for error in errors]
+
+    if not _reserve_stock(db, reserved):
+        # Another transaction got there first (databases without row locks)
+        db.rollback()
+        raise ValueError("Stock changed concurrently; no orders were created")
+
+    stock_changes = []
+    for product_id, quantity in reserved.items():
+        product = products[product_id]
+        threshold = product.low_stock_threshold
+        stock_changes.append(
+            (product_id, product.stock, threshold, product.stock - quantity, threshold)
         )
-        db.add(order_item)
+        # The UPDATE bypassed the ORM, so drop the stale in-memory stock value
+        db.expire(product, ["stock"])
+
+    # One multi-row INSERT. Ids are handed out in VALUES order, so sorting
+    # the returned ids lines them up with the accepted orders; asking for
+    # sort_by_parameter_order instead makes SQLite insert row by row
+    order_date = datetime.now(timezone.utc)
+    order_ids = sorted(
+        db.execute(
+            insert(models.Order)
+            .values(
+                [
+                    {
+                        "customer_name": orders[i].customer_name,
+                        "customer_email": orders[i].customer_email,
+                        "customer_phone": orders[i].customer_phone,
+                        "customer_address": orders[i].customer_address,
+                        "order_date": order_date,
+                        "total_cents": _order_total_cents(orders[i], products),
+                        "status": "pending",
+                    }
+                    for i in accepted
+                ]
+            )
+            .returning(models.Order.id)
+        ).scalars()
+    )
 
-        data["product"].stock -= data["quantity"]
+    db.execute(
+        insert(models.OrderItem),
+        [
+            {
+                "order_id": order_id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price_at_purchase_cents": products[item.product_id].price_cents,
+            }
+            for i, order_id in zip(accepted, order_ids)
+            for item in orders[i].items
+        ],
+    )
+    _roll_up_orders(db, order_ids)
 
     db.commit()
-    db.refresh(db_order)
+    product_cache.invalidate(*reserved)
+    _publish_crossings(stock_changes)
 
-    return db_order
+    created = {
+        order.id: order
+        for order in db.query(models.Order)
+        .options(selectinload(models.Order.items))
+        .filter(models.Order.id.in_(order_ids))
+    }
+    results = [(None, error) for error in errors]
+    for i, order_id in zip(accepted, order_ids):
+        results[i] = (created[order_id], None)
+    return results
 
 
 def update_order_status(db: Session, order_id: int, status: str):
@@ -213,47 +969,354 @@ def update_order_status(db: Session, order_id: int, status: str):
     if db_order is None:
         return None
 
-    db_order.status = status
+    if db_order.status != status:
+        _roll_up_orders(db, [order_id], status)
+        db_order.status = status
     db.commit()
-    db.refresh(db_order)
-    return db_order
+    return _reload_order(db, order_id)
+
+
+def cancel_orders(db: Session, order_ids: list):
+    """Cancel many orders and restore their stock in one transaction.
+
+    The orders and then the affected products are row-locked in ascending id
+    order, and stock for every cancelled item is restored with a single
+    aggregated ``UPDATE products ... FROM order_items``. Orders that are
+    already cancelled are left alone, so retrying a cancellation never
+    restores stock twice. Returns the order ids grouped by outcome.
+    """
+    order_ids = sorted(set(order_ids))
+    statuses = dict(
+        db.query(models.Order.id, models.Order.status)
+        .filter(models.Order.id.in_(order_ids))
+        .order_by(models.Order.id)
+        .with_for_update()
+        .all()
+    )
+
+    outcome = {
+        "cancelled": [],
+        "already_cancelled": [],
+        "not_cancellable": [],
+        "not_found": [],
+    }
+    for order_id in order_ids:
+        status = statuses.get(order_id)
+        if status is None:
+            outcome["not_found"].append(order_id)
+        elif status == schemas.OrderStatus.CANCELLED:
+            outcome["already_cancelled"].append(order_id)
+        elif status == schemas.OrderStatus.DELIVERED:
+            outcome["not_cancellable"].append(order_id)
+        else:
+            outcome["cancelled"].append(order_id)
+
+    cancelled = outcome["cancelled"]
+    if not cancelled:
+        db.rollback()
+        return outcome
+
+    items = models.OrderItem.order_id.in_(cancelled)
+    locked = (
+        db.query(
+            models.Product.id,
+            models.Product.stock,
+            models.Product.low_stock_threshold,
+        )
+        .filter(
+            models.Product.id.in_(db.query(models.OrderItem.product_id).filter(items))
+        )
+        .order_by(models.Product.id)
+        .with_for_update()
+        .all()
+    )
+
+    restored = (
+        db.query(
+            models.OrderItem.product_id,
+            func.sum(models.OrderItem.quantity).label("quantity"),
+        )
+        .filter(items)
+        .group_by(models.OrderItem.product_id)
+        .subquery("restored")
+    )
+    new_stock = dict(
+        db.execute(
+            update(models.Product)
+            .where(models.Product.id == restored.c.product_id)
+            .values(stock=models.Product.stock + restored.c.quantity)
+            .returning(models.Product.id, models.Product.stock)
+            .execution_options(synchronize_session=False)
+        ).all()
+    )
+    _roll_up_orders(db, cancelled, schemas.OrderStatus.CANCELLED.value)
+    db.execute(
+        update(models.Order)
+        .where(models.Order.id.in_(cancelled))
+        .values(status=schemas.OrderStatus.CANCELLED.value)
+        .execution_options(synchronize_session=False)
+    )
+
+    db.commit()
+    product_cache.invalidate(*new_stock)
+    _publish_crossings(
+        (
+            row.id,
+            row.stock,
+            row.low_stock_threshold,
+            new_stock[row.id],
+            row.low_stock_threshold,
+        )
+        for row in locked
+    )
+    return outcome
 
 
 def cancel_order(db: Session, order_id: int):
-    db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    outcome = cancel_orders(db, [order_id])
 
-    if db_order is None:
+    if outcome["not_found"]:
         return None
 
-    if db_order.status == "delivered":
+    if outcome["not_cancellable"]:
         raise ValueError("Cannot cancel a delivered order")
 
-    # Get all order items to restore inventory
-    order_items = (
-        db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).all()
+    return _reload_order(db, order_id)
+
+
+def get_low_stock_products(
+    db: Session, skip: int = 0, limit: int = 100, after_id: int = None
+):
+    """Products at or below their threshold, served by ix_products_low_stock"""
+    query = (
+        db.query(*PRODUCT_COLUMNS)
+        .filter(models.Product.stock <= models.Product.low_stock_threshold)
+        .order_by(models.Product.id)
     )
 
-    # Restore inventory for each item
-    for item in order_items:
+    if after_id is not None:
+        query = query.filter(models.Product.id > after_id)
+
+    return _as_dicts(query.offset(skip).limit(limit))
+
+
+# ANALYTICS
+def _order_day(db: Session, timestamp):
+    """The UTC calendar day of a DateTime column, computed in SQL"""
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(timestamp, Date)
+    return func.date(timestamp)
 
-        product = (
-            db.query(models.Product)
-            .filter(models.Product.id == item.product_id)
-            .first()
+
+def _upsert(db: Session, model):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _add_rollup_deltas(db: Session, model, keys, values, rows, shard: int):
+    """Sum the union of ``rows`` per key and add the sums to ``model``'s rows
+    in ``shard``, in key order, skipping keys whose sums are all zero"""
+    deltas = (rows[0] if len(rows) == 1 else union_all(*rows)).subquery("deltas")
+    key_columns = [deltas.c[key] for key in keys]
+    sums = [func.sum(deltas.c[value]) for value in values]
+    stmt = _upsert(db, model).from_select(
+        [*keys, "shard", *values],
+        select(*key_columns, literal(shard), *sums)
+        .group_by(*key_columns)
+        .having(or_(*(total != 0 for total in sums)))
+        .order_by(*key_columns),
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[*keys, "shard"],
+            set_={
+                value: getattr(model, value) + stmt.excluded[value] for value in values
+            },
+        )
+    )
+
+
+def _roll_up_orders(db: Session, order_ids, status: str = None):
+    """Add orders in their current state to the daily rollups or, with
+    ``status``, move them from their current status to ``status``, with one
+    INSERT ... SELECT ... ON CONFLICT per table. Call it before the orders'
+    UPDATE.
+
+    ``order_ids`` None means every order. All of a call's changes go to one
+    random shard and are written in key order, so concurrent transactions
+    rarely share a rollup row and never lock two in opposite orders.
+    """
+    shard = random.randrange(ROLLUP_SHARDS)
+    order, item = models.Order, models.OrderItem
+    day = _order_day(db, order.order_date).label("day")
+    selected = true() if order_ids is None else order.id.in_(order_ids)
+
+    new_status = order.status if status is None else literal(status, order.status.type)
+    orders = [
+        select(
+            day,
+            new_status.label("status"),
+            literal(1).label("orders"),
+            order.total_cents.label("revenue_cents"),
+        ).where(selected)
+    ]
+    if status is not None:
+        orders.append(
+            select(day, order.status, literal(-1), -order.total_cents).where(selected)
+        )
+    _add_rollup_deltas(
+        db,
+        models.OrderDailyStats,
+        ("day", "status"),
+        ("orders", "revenue_cents"),
+        orders,
+        shard,
+    )
+
+    # Product sales only count orders that are not cancelled, so a move
+    # between two other statuses nets out and writes nothing
+    cancelled = schemas.OrderStatus.CANCELLED.value
+    not_cancelled = order.status != cancelled
+    lines = (
+        select(day, item.product_id.label("product_id"))
+        .join(order, order.id == item.order_id)
+        .where(selected)
+    )
+    revenue = item.quantity * item.price_at_purchase_cents
+    items = []
+    if status != cancelled:
+        added = lines.add_columns(
+            item.quantity.label("units"), revenue.label("revenue_cents")
+        )
+        items.append(added.where(not_cancelled) if status is None else added)
+    if status is not None:
+        removed = lines.add_columns(
+            (-item.quantity).label("units"), (-revenue).label("revenue_cents")
         )
-        if product:
-            product.stock += item.quantity
+        items.append(removed.where(not_cancelled))
+    _add_rollup_deltas(
+        db,
+        models.ProductDailySales,
+        ("day", "product_id"),
+        ("units", "revenue_cents"),
+        items,
+        shard,
+    )
+
 
-    # Update order status to cancelled
-    db_order.status = "cancelled"
+def rebuild_order_rollups(db: Session):
+    """Recompute the daily rollups from scratch, e.g. after loading orders
+    without going through create_order; this also folds each key's shards
+    into one row"""
+    db.query(models.OrderDailyStats).delete(synchronize_session=False)
+    db.query(models.ProductDailySales).delete(synchronize_session=False)
+    _roll_up_orders(db, None)
     db.commit()
-    db.refresh(db_order)
-    return db_order
 
 
-def get_low_stock_products(db: Session):
-    return (
-        db.query(models.Product)
-        .filter(models.Product.stock <= models.Product.low_stock_threshold)
-        .all()
+def get_revenue_by_day(
+    db: Session, start: date = None, end: date = None, status: str = None
+):
+    """Orders and revenue per day and status between ``start`` and ``end``
+    (inclusive), oldest first"""
+    stats = models.OrderDailyStats
+    orders = func.sum(stats.orders)
+    query = (
+        db.query(
+            stats.day,
+            stats.status,
+            orders.label("orders"),
+            func.sum(stats.revenue_cents).label("revenue_cents"),
+        )
+        .group_by(stats.day, stats.status)
+        .having(orders != 0)
     )
+
+    if start is not None:
+        query = query.filter(stats.day >= start)
+
+    if end is not None:
+        query = query.filter(stats.day <= end)
+
+    if status is not None:
+        query = query.filter(stats.status == status)
+
+    return [
+        schemas.RevenueByDay(
+            day=row.day,
+            status=row.status,
+            orders=row.orders,
+            revenue=from_cents(row.revenue_cents),
+        )
+        for row in query.order_by(stats.day, stats.status)
+    ]
+
+
+def _product_sales(db: Session, start: date = None, end: date = None):
+    sales = models.ProductDailySales
+    units = func.sum(sales.units).label("units")
+    query = (
+        db.query(
+            models.Product.id.label("product_id"),
+            models.Product.name,
+            models.Product.stock,
+            units,
+            func.sum(sales.revenue_cents).label("revenue_cents"),
+        )
+        .join(models.Product, models.Product.id == sales.product_id)
+        .group_by(models.Product.id, models.Product.name, models.Product.stock)
+        .having(units > 0)
+        .order_by(units.desc(), models.Product.id)
+    )
+
+    if start is not None:
+        query = query.filter(sales.day >= start)
+
+    if end is not None:
+        query = query.filter(sales.day <= end)
+
+    return query
+
+
+def get_top_products(
+    db: Session, start: date = None, end: date = None, limit: int = 10
+):
+    """Best sellers by units between ``start`` and ``end`` (inclusive)"""
+    return [
+        schemas.ProductSales(
+            product_id=row.product_id,
+            name=row.name,
+            units=row.units,
+            revenue=from_cents(row.revenue_cents),
+        )
+        for row in _product_sales(db, start, end).limit(limit)
+    ]
+
+
+def get_sales_velocity(
+    db: Session, days: int = 30, limit: int = 100, product_id: int = None
+):
+    """Average units sold per day over the last ``days`` days (today
+    included), fastest sellers first, with the days of stock left at that
+    rate"""
+    today = _utcnow().date()
+    query = _product_sales(db, start=today - timedelta(days=days - 1), end=today)
+
+    if product_id is not None:
+        query = query.filter(models.Product.id == product_id)
+
+    velocity = []
+    for row in query.limit(limit):
+        units_per_day = row.units / days
+        velocity.append(
+            schemas.SalesVelocity(
+                product_id=row.product_id,
+                name=row.name,
+                stock=row.stock,
+                units=row.units,
+                units_per_day=units_per_day,
+                days_of_stock=row.stock / units_per_day,
+            )
+        )
+    return velocity
@@ -1,23 +1,153 @@
 import os
 
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from app.instrumentation import track_operation
+from app.pool import engine_options, instrument
+
 DATABASE_URL = os.getenv(
     "DATABASE_URL", "postgresql://syncstock:supersecretpassword@db/syncstock"
 )
 
-engine = create_engine(DATABASE_URL)
+# Serve requests from an AsyncEngine instead of pinning a threadpool worker
+ASYNC_DATABASE = os.getenv("ASYNC_DATABASE", "false").lower() in ("1", "true", "yes")
+
+# Async drivers for the sync URLs we accept in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a sync database URL for its async counterpart"""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+# Optional read replica for read-only listings; unset means read from primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL") or None
+ASYNC_DATABASE_REPLICA_URL = os.getenv("ASYNC_DATABASE_REPLICA_URL") or (
+    async_database_url(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+)
+
+# Requests carrying this header read from the primary even when a replica is
+# configured, for clients that must see their own just-committed writes
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+instrument(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_engine = None
+ReplicaSessionLocal = None
+if DATABASE_REPLICA_URL and not ASYNC_DATABASE:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)
+    )
+    instrument(replica_engine)
+    ReplicaSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine
+    )
+
+# Only built in async mode so the async driver is not required otherwise.
+# Objects must stay readable after commit, since lazy loads cannot run once
+# the response is being serialized outside the session's greenlet.
+async_engine = None
+if ASYNC_DATABASE:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True)
+    )
+    instrument(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if ASYNC_DATABASE_REPLICA_URL and ASYNC_DATABASE:
+    async_replica_engine = create_async_engine(
+        ASYNC_DATABASE_REPLICA_URL,
+        **engine_options(ASYNC_DATABASE_REPLICA_URL, is_async=True),
+    )
+    instrument(async_replica_engine.sync_engine)
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=async_replica_engine, autoflush=False, expire_on_commit=False
+    )
+
 Base = declarative_base()
 
 
-def get_db():
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if ASYNC_DATABASE else get_sync_db
+
+
+def reads_from_primary(request: Request) -> bool:
+    return request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true", "yes")
+
+
+async def get_read_db(request: Request, db=Depends(get_db)):
+    """Session for read-only endpoints: the replica when one is configured.
+
+    Falls back to the primary session ``db`` (which has not connected yet,
+    so it costs nothing when unused) without a replica or when the client
+    asks for read-your-writes with the X-Read-Primary header.
+    """
+    if ASYNC_DATABASE:
+        replica_sessionmaker = AsyncReplicaSessionLocal
+    else:
+        replica_sessionmaker = ReplicaSessionLocal
+
+    if replica_sessionmaker is None or reads_from_primary(request):
+        yield db
+        return
+
+    if ASYNC_DATABASE:
+        async with replica_sessionmaker() as replica:
+            yield replica
+        return
+
+    replica = replica_sessionmaker()
+    try:
+        yield replica
+    finally:
+        await run_in_threadpool(replica.close)
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run a sync crud function against either kind of session.
+
+    Sync sessions run it in the threadpool, the same as a plain ``def``
+    endpoint would; async sessions run it on the event loop through
+    ``AsyncSession.run_sync``, so the crud logic is written only once.
+    The SQL it issues is attributed to ``fn`` in the query metrics.
+    """
+    with track_operation(fn.__name__):
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -0,0 +1,75 @@
+"""In-process fan-out of stock events to streaming subscribers.
+
+Writers publish from whichever thread ran the database work; each
+subscriber owns a bounded queue on its event loop. A subscriber that falls
+behind loses its oldest events rather than slowing writers down or growing
+without limit, and is told how many it missed so it can resync.
+"""
+
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+
+
+class Subscription:
+    def __init__(self, loop, maxsize: int):
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize)
+        self._dropped = 0
+
+    async def get(self):
+        return await self._queue.get()
+
+    def take_dropped(self) -> int:
+        """Events lost to a full queue since the last call"""
+        dropped, self._dropped = self._dropped, 0
+        return dropped
+
+    def _put(self, event):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._dropped += 1
+        self._queue.put_nowait(event)
+
+
+class EventBus:
+    """Delivers every published event to every current subscriber"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    @contextmanager
+    def subscribe(self):
+        """Subscribe for the duration of a ``with`` block on the running loop"""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions.discard(subscription)
+
+    def publish(self, event) -> None:
+        """Queue an event for every subscriber; safe to call from any thread"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # The subscriber's loop has closed; it is about to unsubscribe
+                pass
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+
+# Products crossing their low-stock threshold, as schemas.StockEvent
+stock_events = EventBus(EVENT_QUEUE_SIZE)
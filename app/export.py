@@ -0,0 +1,129 @@
+"""Streaming NDJSON and CSV exports.
+
+Rows are read from a server-side cursor (``yield_per``) one partition at a
+time and encoded as they arrive, so an export holds one partition in memory
+however many rows it has, and the first bytes go out as soon as the first
+partition is read.
+"""
+
+import csv
+import io
+from datetime import datetime
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+# Rows fetched from the cursor and encoded per chunk of the response
+EXPORT_PARTITION_SIZE = 1000
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+ORDER_FIELDS = (
+    "id",
+    "customer_name",
+    "customer_email",
+    "customer_phone",
+    "customer_address",
+    "order_date",
+    "status",
+    "total_amount",
+)
+
+
+async def stream_partitions(db, statement):
+    """Yield lists of rows of ``statement`` from a server-side cursor.
+
+    Sync sessions fetch each partition in the threadpool, async sessions
+    through ``AsyncSession.stream``.
+    """
+    statement = statement.execution_options(yield_per=EXPORT_PARTITION_SIZE)
+
+    if isinstance(db, AsyncSession):
+        result = await db.stream(statement)
+        try:
+            async for partition in result.partitions():
+                yield partition
+        finally:
+            await result.close()
+        return
+
+    result = await run_in_threadpool(db.execute, statement)
+    partitions = result.partitions()
+    try:
+        while True:
+            partition = await run_in_threadpool(next, partitions, None)
+            if partition is None:
+                break
+            yield partition
+    finally:
+        await run_in_threadpool(result.close)
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_chunk(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def products_ndjson(partitions):
+    async for partition in partitions:
+        yield b"".join(orjson.dumps(row._asdict()) + b"\n" for row in partition)
+
+
+async def rows_csv(partitions, header):
+    """One CSV line per row, after a header line naming the columns"""
+    yield _csv_chunk([header])
+    async for partition in partitions:
+        yield _csv_chunk(partition)
+
+
+async def orders_ndjson(partitions):
+    """One JSON order per line, with its items nested as in ``schemas.Order``.
+
+    An order's rows are adjacent but may straddle two partitions, so the
+    last order of a partition is held back until its rows are complete.
+    """
+    order = None
+    async for partition in partitions:
+        lines = []
+        for row in partition:
+            if order is None or row.id != order["id"]:
+                if order is not None:
+                    lines.append(orjson.dumps(order))
+                order = {field: getattr(row, field) for field in ORDER_FIELDS}
+                order["items"] = []
+            if row.item_id is not None:
+                order["items"].append(
+                    {
+                        "id": row.item_id,
+                        "order_id": row.id,
+                        "product_id": row.product_id,
+                        "quantity": row.quantity,
+                        "price_at_purchase": row.price_at_purchase,
+                    }
+                )
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    if order is not None:
+        yield orjson.dumps(order) + b"\n"
+
+
+def export_response(db, statement, fmt: str, ndjson, filename: str):
+    """Stream ``statement`` as CSV (one line per row) or through ``ndjson``"""
+    partitions = stream_partitions(db, statement)
+    if fmt == "csv":
+        body = rows_csv(partitions, list(statement.selected_columns.keys()))
+    else:
+        body = ndjson(partitions)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
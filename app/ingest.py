@@ -0,0 +1,68 @@
+"""Streaming parsers for bulk uploads.
+
+Uploads are parsed line by line as the request body arrives, so only the
+current line (and the caller's current chunk of rows) is held in memory.
+CSV rows must therefore not contain quoted line breaks.
+"""
+
+import csv
+import json
+
+
+def detect_format(content_type: str) -> str:
+    """Pick the upload format from a Content-Type header, defaulting to NDJSON"""
+    return "csv" if "csv" in (content_type or "").lower() else "ndjson"
+
+
+async def iter_lines(chunks):
+    """Yield (line_number, raw_line) for each non-blank line of a byte stream"""
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line.strip()
+    if buffer.strip():
+        yield line_number + 1, buffer.strip()
+
+
+async def iter_records(chunks, fmt: str):
+    """Yield (line_number, record, error) for each row of an NDJSON or CSV body.
+
+    ``record`` is a dict of raw field values, or None with ``error`` set when
+    the line could not be parsed at all.
+    """
+    header = None
+    async for line_number, line in iter_lines(chunks):
+        try:
+            text = line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+        except UnicodeDecodeError:
+            yield line_number, None, "Line is not valid UTF-8"
+            continue
+
+        if fmt == "csv":
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                yield line_number, None, (
+                    f"Expected {len(header)} columns, got {len(values)}"
+                )
+                continue
+            # Empty cells mean "not given", so schema defaults apply
+            record = {k: v for k, v in zip(header, values) if v.strip() != ""}
+            yield line_number, record, None
+        else:
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Expected a JSON object"
+                continue
+            yield line_number, record, None
@@ -0,0 +1,197 @@
+"""Request and query instrumentation feeding the ``/metrics`` endpoint.
+
+Every SQL statement is attributed to the crud function that issued it:
+``run_db`` marks the operation in a context variable, which follows the call
+into the threadpool or ``AsyncSession.run_sync``, and cursor execution hooks
+read it back. Queries per call make N+1 patterns stand out as counts that
+grow with the request instead of staying flat.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import Gauge, Histogram, registry
+
+REQUEST_LATENCY = registry.register(
+    Histogram(
+        "syncstock_http_request_duration_seconds",
+        "Time to serve a request, by route template",
+        ["method", "route", "status"],
+    )
+)
+REQUESTS_IN_FLIGHT = registry.register(
+    Gauge(
+        "syncstock_http_requests_in_flight",
+        "Requests currently being served",
+        ["method"],
+    )
+)
+QUERY_DURATION = registry.register(
+    Histogram(
+        "syncstock_db_query_duration_seconds",
+        "Time spent in each SQL statement, by the crud function that ran it",
+        ["operation"],
+    )
+)
+QUERIES_PER_CALL = registry.register(
+    Histogram(
+        "syncstock_db_queries_per_call",
+        "SQL statements issued by one call of a crud function",
+        ["operation"],
+        buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250, 1000),
+    )
+)
+
+# Statements outside any crud call (startup, migrations, ad hoc sessions)
+UNATTRIBUTED = "other"
+
+# Statements one request may run before QueryBudgetMiddleware warns
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "20"))
+
+logger = logging.getLogger(__name__)
+
+
+class Operation:
+    def __init__(self, name: str):
+        self.name = name
+        self.queries = 0
+
+
+class QueryCounter:
+    """SQL statements seen, kept so a blown budget can show what ran"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+_operation: ContextVar = ContextVar("syncstock_db_operation", default=None)
+_request_queries: ContextVar = ContextVar("syncstock_request_queries", default=None)
+
+
+@contextmanager
+def track_operation(name: str):
+    """Attribute the SQL issued inside the block to the operation ``name``"""
+    operation = Operation(name)
+    token = _operation.set(operation)
+    try:
+        yield operation
+    finally:
+        _operation.reset(token)
+        if operation.queries:
+            QUERIES_PER_CALL.observe(operation.queries, operation=name)
+
+
+@contextmanager
+def count_queries(engine=Engine):
+    """Count the statements run on ``engine`` (any engine by default).
+
+    Counts across threads, so it also sees requests served by a TestClient.
+    """
+    counter = QueryCounter()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._syncstock_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._syncstock_query_start
+    request_queries = _request_queries.get()
+    if request_queries is not None:
+        request_queries.statements.append(statement)
+    operation = _operation.get()
+    if operation is None:
+        QUERY_DURATION.observe(elapsed, operation=UNATTRIBUTED)
+        return
+    operation.queries += 1
+    QUERY_DURATION.observe(elapsed, operation=operation.name)
+
+
+class MetricsMiddleware:
+    """Records latency per route template and requests in flight"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(method=method)
+            # The router stores the matched route in the scope; templates
+            # keep the label set bounded, unlike raw paths
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+class QueryBudgetMiddleware:
+    """Warns about requests that run more than ``budget`` SQL statements.
+
+    Meant for development (DEBUG), where it points at N+1 queries while the
+    offending request is still fresh in mind.
+    """
+
+    def __init__(self, app, budget: int = QUERY_BUDGET):
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = QueryCounter()
+        token = _request_queries.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+            if counter.count > self.budget:
+                logger.warning(
+                    "%s %s ran %d SQL statements (budget %d)",
+                    scope["method"],
+                    scope["path"],
+                    counter.count,
+                    self.budget,
+                )
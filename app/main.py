@@ -1,18 +1,43 @@
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from app.routers import auth, orders, products
+from app.instrumentation import MetricsMiddleware, QueryBudgetMiddleware
+from app.passwords import password_hasher
+from app.routers import analytics, auth, events, metrics, orders, products
+
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    password_hasher.shutdown()
+
 
 # Creat the FastAPI application
 app = FastAPI(
     title="SyncStock API",
     description="Inventory and Order Management SaaS",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
-# Include the product, auth, and order routers
+# Request latency and in-flight metrics, exported at GET /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Log requests that run more SQL than QUERY_BUDGET while developing
+if DEBUG:
+    app.add_middleware(QueryBudgetMiddleware)
+
+# Include the product, auth, order, analytics, metrics and event stream routers
 app.include_router(products.router)
 app.include_router(orders.router)
+app.include_router(analytics.router)
 app.include_router(auth.router)
+app.include_router(metrics.router)
+app.include_router(events.router)
 
 
 # Root endpoint
@@ -1,9 +1,23 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+)
 from sqlalchemy.orm import relationship
 
 from app.database import Base
+from app.money import from_cents, to_cents
 
 # WHEN YOU EDIT A MODEL
 # run this:
@@ -32,10 +46,37 @@ class Product(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(512), nullable=False, index=True)
-    price = Column(Float, nullable=False)
+    price_cents = Column(BigInteger, nullable=False)
     stock = Column(Integer, nullable=False, default=0)
     low_stock_threshold = Column(Integer, nullable=False, default=10)
 
+    @property
+    def price(self):
+        return from_cents(self.price_cents)
+
+    @price.setter
+    def price(self, amount):
+        self.price_cents = to_cents(amount)
+
+    __table_args__ = (
+        # Serves ILIKE '%term%' and similarity() ranking in product search
+        Index(
+            "ix_products_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        # Partial index holding only low-stock rows, so the low-stock listing
+        # reads those rows instead of scanning the catalog. The database keeps
+        # it current on every stock or threshold change.
+        Index(
+            "ix_products_low_stock",
+            "id",
+            postgresql_where=stock <= low_stock_threshold,
+            sqlite_where=stock <= low_stock_threshold,
+        ),
+    )
+
 
 class Order(Base):
     __tablename__ = "orders"
@@ -49,17 +90,101 @@ class Order(Base):
         DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
     )
     status = Column(String(100), nullable=False, default="pending")
-    total_amount = Column(Float, nullable=False, default=0.0)
+    total_cents = Column(BigInteger, nullable=False, default=0)
     items = relationship("OrderItem", back_populates="order")
 
+    @property
+    def total_amount(self):
+        return from_cents(self.total_cents)
+
+    __table_args__ = (
+        # Listings page through (order_date, id), optionally for one status
+        Index("ix_orders_order_date_id", "order_date", "id"),
+        Index("ix_orders_status_order_date_id", "status", "order_date", "id"),
+        # Serves the ILIKE '%term%' customer_email filter
+        Index(
+            "ix_orders_customer_email_trgm",
+            "customer_email",
+            postgresql_using="gin",
+            postgresql_ops={"customer_email": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
-    price_at_purchase = Column(Float, nullable=False)
+    price_at_purchase_cents = Column(BigInteger, nullable=False)
     order = relationship("Order", back_populates="items")
     product = relationship("Product")
+
+    @property
+    def price_at_purchase(self):
+        return from_cents(self.price_at_purchase_cents)
+
+
+class OrderDailyStats(Base):
+    """Orders and revenue per order day and current status.
+
+    Maintained by crud as orders are created and change status, so revenue
+    reports read a few rows per day instead of every order. Each transaction
+    adds to one of ``crud.ROLLUP_SHARDS`` rows per key so that concurrent
+    orders rarely wait on the same row; reports sum the shards.
+    """
+
+    __tablename__ = "order_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    status = Column(String(100), primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(BigInteger, nullable=False, default=0)
+
+    @property
+    def revenue(self):
+        return from_cents(self.revenue_cents)
+
+
+class ProductDailySales(Base):
+    """Units and revenue per product and order day, cancelled orders
+    excluded, sharded like ``OrderDailyStats``"""
+
+    __tablename__ = "product_daily_sales"
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(BigInteger, nullable=False, default=0)
+
+    @property
+    def revenue(self):
+        return from_cents(self.revenue_cents)
+
+
+class IdempotencyKey(Base):
+    """A client's Idempotency-Key for POST /orders and the response it got"""
+
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"))
+    response = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# The trigram indexes on products.name and orders.customer_email need the
+# pg_trgm extension
+for table in (Product.__table__, Order.__table__):
+    event.listen(
+        table,
+        "before_create",
+        DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+    )
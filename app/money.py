@@ -0,0 +1,23 @@
+"""Exact money: integer cents in the database, Decimal in Python.
+
+Prices, order totals and revenue are stored as integer minor units, so sums
+and comparisons in SQL are exact integer arithmetic. Schemas expose them as
+``Decimal`` with two places and write them to JSON as plain numbers, which
+keeps the API's number format.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+CENT = Decimal("0.01")
+
+
+def to_cents(amount) -> int:
+    """Convert a Decimal (or a float or str) amount to integer cents"""
+    if not isinstance(amount, Decimal):
+        # str() gives the shortest repr, so 29.99 becomes exactly 29.99
+        amount = Decimal(str(amount))
+    return int((amount * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    return (Decimal(cents) / 100).quantize(CENT)
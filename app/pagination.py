@@ -0,0 +1,59 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor is the sort key of the last row on a page, JSON encoded and then
+base64url encoded so clients treat it as an opaque token. The next page is
+fetched with ``WHERE key > cursor`` on an index instead of an OFFSET, so
+page N costs the same as page 1.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*key) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Decode a cursor, converting each part of the key with ``types``"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("Cursor has the wrong shape")
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def product_key(cursor: str):
+    """Decode a products cursor into the id of the last product seen"""
+    return decode_cursor(cursor, int)[0]
+
+
+def search_key(cursor: str, ranked: bool):
+    """Decode a product search cursor.
+
+    Ranked searches are ordered by (search_rank, id); unranked ones by id.
+    """
+    if ranked:
+        return decode_cursor(cursor, int, int)
+    return decode_cursor(cursor, int)
+
+
+def order_key(cursor: str):
+    """Decode an orders cursor into the (order_date, id) of the last order seen"""
+    return decode_cursor(cursor, datetime.fromisoformat, int)
+
+
+def set_next_cursor(response: Response, items, limit: int, key):
+    """Advertise the cursor for the next page when this page came back full"""
+    if items and len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(items[-1]))
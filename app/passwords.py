@@ -0,0 +1,112 @@
+"""Password hashing in a bounded process pool.
+
+bcrypt is deliberately slow (~100-250 ms of CPU per call), so hashing on the
+request threads lets a login burst starve every other endpoint. Register and
+login hand the work to a small dedicated process pool instead, and once
+every worker is busy and the queue is full new requests are turned away
+rather than piling up.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Every hashing worker is busy and the queue is full"""
+
+
+class PasswordHasher:
+    """Runs hash/verify in worker processes, with at most ``queue_limit`` waiting"""
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._slots = threading.BoundedSemaphore(max(1, workers + queue_limit))
+        self._lock = threading.Lock()
+        self._pool = None
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(check_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+
+        # Zero workers hashes in the threadpool, still under the queue limit
+        if self.workers <= 0:
+            try:
+                return await run_in_threadpool(fn, *args)
+            finally:
+                self._slots.release()
+
+        try:
+            pool = self._executor()
+            try:
+                future = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died since the last call and nothing ran yet, so
+                # retry once on a fresh pool
+                self._discard(pool)
+                pool = self._executor()
+                future = pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # A worker died with this call in flight; the next call respawns
+            self._discard(pool)
+            raise
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that is already running threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _discard(self, pool):
+        """Drop a broken pool, unless another call has already replaced it"""
+        with self._lock:
+            if self._pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
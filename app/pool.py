@@ -0,0 +1,169 @@
+"""Connection pool configuration and metrics.
+
+Pool sizing comes from the environment so each API replica can be tuned
+against PostgreSQL's ``max_connections``: every replica may open up to
+``DB_POOL_SIZE + DB_MAX_OVERFLOW`` connections per engine. The pools record
+how often and how long requests waited for a connection, which is the
+signal that a replica needs a bigger pool (or the database more headroom).
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds after which a connection is replaced; -1 keeps connections forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "false")
+
+# Checkouts slower than this count as having waited for a connection
+WAIT_THRESHOLD_SECONDS = 0.001
+
+
+class PoolStats:
+    """Counters fed by pool events and by the metered pools' checkouts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.overflow_peak = 0
+
+    def record_wait(self, seconds: float, overflow: int):
+        with self._lock:
+            if seconds >= WAIT_THRESHOLD_SECONDS:
+                self.waits += 1
+                self.wait_seconds_total += seconds
+                self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.overflow_peak = max(self.overflow_peak, overflow)
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "waits": self.waits,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "timeouts": self.timeouts,
+                "overflow_peak": self.overflow_peak,
+            }
+
+
+class _MeteredPool:
+    """Times each checkout's wait for a free slot; ``recreate``
+    (engine.dispose) keeps the stats.
+
+    Opening a new connection (TCP, TLS, authentication) happens inside the
+    checkout too, but is not waiting on the pool, so its time is left out.
+    """
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.max_overflow = max_overflow
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        record = super()._create_connection()
+        # Read back (and reset) by the _do_get that opened it
+        record.metered_connect_seconds = time.perf_counter() - start
+        return record
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except sa_exc.TimeoutError:
+            self.stats.increment("timeouts")
+            raise
+        waited = time.perf_counter() - start
+        connect_seconds = getattr(record, "metered_connect_seconds", 0.0)
+        record.metered_connect_seconds = 0.0
+        self.stats.record_wait(waited - connect_seconds, max(0, self.overflow()))
+        return record
+
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Pool keyword arguments for create_engine / create_async_engine.
+
+    SQLite keeps SQLAlchemy's defaults: its in-memory databases need a
+    single shared connection, and there is no server to size against.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": MeteredAsyncQueuePool if is_async else MeteredQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def instrument(engine):
+    """Count checkouts, new connections and invalidations on a metered pool"""
+    if not isinstance(engine.pool, _MeteredPool):
+        return
+
+    def counter(name):
+        # Looked up per event, since engine.dispose() swaps in a new pool
+        return lambda *args: engine.pool.stats.increment(name)
+
+    event.listen(engine, "checkout", counter("checkouts"))
+    event.listen(engine, "connect", counter("connects"))
+    event.listen(engine, "invalidate", counter("invalidations"))
+
+
+def pool_metrics(engine) -> dict:
+    """Current pool occupancy plus the counters of a metered pool"""
+    pool = engine.pool
+    metrics = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        metrics.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(0, pool.overflow()),
+            timeout_seconds=pool.timeout(),
+        )
+    if isinstance(pool, _MeteredPool):
+        metrics["max_overflow"] = pool.max_overflow
+        metrics.update(pool.stats.snapshot())
+    return metrics
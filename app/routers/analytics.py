@@ -0,0 +1,57 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app import crud, schemas
+from app.database import get_read_db, run_db
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"],
+)
+
+
+@router.get("/revenue", response_model=List[schemas.RevenueByDay])
+async def get_revenue(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    status: Optional[schemas.OrderStatus] = None,
+    db=Depends(get_read_db),
+):
+    """Orders and revenue per day and status, from the daily rollup"""
+    return await run_db(
+        db,
+        crud.get_revenue_by_day,
+        start=start,
+        end=end,
+        status=status.value if status else None,
+    )
+
+
+@router.get("/top-products", response_model=List[schemas.ProductSales])
+async def get_top_products(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    db=Depends(get_read_db),
+):
+    """Best selling products by units, cancelled orders excluded"""
+    return await run_db(db, crud.get_top_products, start=start, end=end, limit=limit)
+
+
+@router.get("/sales-velocity", response_model=List[schemas.SalesVelocity])
+async def get_sales_velocity(
+    days: int = Query(30, ge=1, le=3660),
+    limit: int = Query(100, ge=1, le=1000),
+    product_id: Optional[int] = None,
+    db=Depends(get_read_db),
+):
+    """Units sold per day over the last ``days`` days and the stock runway"""
+    return await run_db(
+        db,
+        crud.get_sales_velocity,
+        days=days,
+        limit=limit,
+        product_id=product_id,
+    )
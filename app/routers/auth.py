@@ -1,39 +1,64 @@
+from concurrent.futures.process import BrokenProcessPool
 from datetime import timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
 
 from app import crud, schemas
 from app.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token,
     get_current_active_user,
+    token_claims,
 )
-from app.database import get_db
+from app.database import get_db, run_db
+from app.passwords import PasswordHasherBusy, password_hasher
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
+async def _hashing(operation, *args):
+    """Run a password hasher operation, shedding load when its pool is full"""
+    try:
+        return await operation(*args)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    except BrokenProcessPool:
+        # A worker died with this call in flight; the pool is respawned on
+        # the next call, so a retry succeeds
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Password worker restarted, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
 @router.post("/register", response_model=schemas.User, status_code=201)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db=Depends(get_db)):
+    db_user = await run_db(db, crud.get_user_by_email, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    db_user = crud.get_user_by_username(db, username=user.username)
+    db_user = await run_db(db, crud.get_user_by_username, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    return crud.create_user(db=db, user=user)
+    hashed_password = await _hashing(password_hasher.hash, user.password)
+    return await run_db(
+        db, crud.create_user, user=user, hashed_password=hashed_password
+    )
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
-):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_db)):
+    user = await run_db(db, crud.get_user_by_username, username=form_data.username)
+    if not user or not await _hashing(
+        password_hasher.verify, form_data.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -41,11 +66,11 @@ def login(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: schemas.User = Depends(get_current_active_user)):
+async def read_users_me(current_user: schemas.User = Depends(get_current_active_user)):
     return current_user
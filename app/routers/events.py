@@ -0,0 +1,48 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from app.events import stock_events
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"],
+)
+
+# Comment lines sent while idle keep proxies from closing the stream
+KEEPALIVE_SECONDS = 15.0
+
+
+async def _stream_stock_events():
+    with stock_events.subscribe() as subscription:
+        # Flush the headers right away so clients know they are subscribed
+        yield ": subscribed\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), timeout=KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            dropped = subscription.take_dropped()
+            if dropped:
+                # This client fell behind; it should re-read /products/low-stock
+                yield f'event: dropped\ndata: {{"count": {dropped}}}\n\n'
+            yield f"event: {event.event}\ndata: {event.model_dump_json()}\n\n"
+
+
+@router.get("/low-stock")
+async def stream_low_stock_events():
+    """Server-Sent Events for products crossing their low-stock threshold.
+
+    ``low_stock`` events are sent when a product falls to or below its
+    threshold and ``restocked`` events when it rises back above it.
+    """
+    return StreamingResponse(
+        _stream_stock_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,45 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.cache import product_cache, user_cache
+from app.database import (
+    ASYNC_DATABASE,
+    async_engine,
+    async_replica_engine,
+    engine,
+    replica_engine,
+)
+from app.metrics import registry
+from app.pool import pool_metrics
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Request and query metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/cache")
+async def get_cache_metrics():
+    """Hit/miss counters for sizing the product and user caches"""
+    return {"products": product_cache.stats(), "users": user_cache.stats()}
+
+
+@router.get("/pool")
+async def get_pool_metrics():
+    """Connection pool occupancy, waits and overflow for tuning pool sizes"""
+    if ASYNC_DATABASE:
+        primary = async_engine.sync_engine
+        replica = async_replica_engine and async_replica_engine.sync_engine
+    else:
+        primary, replica = engine, replica_engine
+
+    metrics = {"primary": pool_metrics(primary)}
+    if replica is not None:
+        metrics["replica"] = pool_metrics(replica)
+    return metrics
@@ -1,11 +1,11 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 
-from app import crud, models, schemas
-from app.auth import get_current_active_user
-from app.database import get_db
+from app import crud, export, pagination, schemas
+from app.auth import get_active_principal
+from app.database import get_db, get_read_db, run_db
+from app.serialization import FastJSONResponse, fast_json
 
 router = APIRouter(
     prefix="/orders",
@@ -13,53 +13,163 @@ router = APIRouter(
 )
 
 
-@router.get("/filter", response_model=List[schemas.Order])
-def filter_order(
+def _order_sort_key(order: dict):
+    return order["order_date"], order["id"]
+
+
+@router.get("/export")
+async def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    customer_email: Optional[str] = None,
+    db=Depends(get_read_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
+):
+    """Stream every order matching the filter_orders filters as NDJSON or CSV.
+
+    NDJSON has one order per line with its items nested; CSV has one line
+    per item, repeating the order columns.
+    """
+    statement = crud.order_export_statement(
+        status=status, customer_email=customer_email
+    )
+    return export.export_response(db, statement, format, export.orders_ndjson, "orders")
+
+
+@router.get(
+    "/filter", response_model=List[schemas.Order], response_class=FastJSONResponse
+)
+async def filter_order(
+    response: Response,
     status: Optional[str] = None,
     customer_email: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db=Depends(get_read_db),
 ):
-    return crud.filter_orders(
-        db, status=status, customer_email=customer_email, skip=skip, limit=limit
+    orders = await run_db(
+        db,
+        crud.filter_orders,
+        status=status,
+        customer_email=customer_email,
+        skip=skip,
+        limit=limit,
+        after=pagination.order_key(cursor) if cursor else None,
     )
+    pagination.set_next_cursor(response, orders, limit, key=_order_sort_key)
+    return fast_json(orders, response)
 
 
 @router.post("", response_model=schemas.Order, status_code=201)
-def create_order(
+async def create_order(
     order: schemas.OrderCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    response: Response,
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
 ):
+    """Create an order; retries with the same Idempotency-Key replay the first result"""
     try:
-        return crud.create_order(db, order=order)
+        if idempotency_key is None:
+            return await run_db(db, crud.create_order, order=order)
+        created, replayed = await run_db(
+            db,
+            crud.create_order_once,
+            order=order,
+            user_id=current_user.id,
+            key=idempotency_key,
+        )
+    except crud.IdempotencyKeyReused:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    except crud.IdempotencyKeyInProgress:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return created
 
-@router.get("", response_model=List[schemas.Order])
-def get_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_orders(db, skip=skip, limit=limit)
+
+@router.post("/batch", response_model=schemas.OrderBatchResult)
+async def create_orders(
+    batch: schemas.OrderBatchCreate,
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
+):
+    """Create many orders in one transaction; each succeeds or fails on its own"""
+    try:
+        results = await run_db(db, crud.create_orders, orders=batch.orders)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    created = sum(order is not None for order, _ in results)
+    return schemas.OrderBatchResult(
+        created=created,
+        failed=len(results) - created,
+        results=[
+            schemas.OrderBatchItemResult(index=i, order=order, error=error)
+            for i, (order, error) in enumerate(results)
+        ],
+    )
+
+
+@router.post("/cancel", response_model=schemas.OrderCancelResult)
+async def cancel_orders(
+    cancel_request: schemas.OrderCancelRequest,
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
+):
+    """Cancel many orders at once, restoring their stock in one transaction"""
+    return await run_db(db, crud.cancel_orders, order_ids=cancel_request.order_ids)
+
+
+@router.get("", response_model=List[schemas.Order], response_class=FastJSONResponse)
+async def get_orders(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db=Depends(get_read_db),
+):
+    orders = await run_db(
+        db,
+        crud.get_orders,
+        skip=skip,
+        limit=limit,
+        after=pagination.order_key(cursor) if cursor else None,
+    )
+    pagination.set_next_cursor(response, orders, limit, key=_order_sort_key)
+    return fast_json(orders, response)
 
 
 @router.get("/{order_id}", response_model=schemas.Order)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = crud.get_order(db, order_id=order_id)
+async def get_order(order_id: int, db=Depends(get_db)):
+    order = await run_db(db, crud.get_order, order_id=order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 
 @router.patch("/{order_id}/status", response_model=schemas.Order)
-def update_order_status(
+async def update_order_status(
     order_id: int,
     status_update: schemas.OrderStatusUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
 ):
-    updated_order = crud.update_order_status(
-        db, order_id=order_id, status=status_update.status.value
+    updated_order = await run_db(
+        db,
+        crud.update_order_status,
+        order_id=order_id,
+        status=status_update.status.value,
     )
     if updated_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -67,13 +177,13 @@ def update_order_status(
 
 
 @router.delete("/{order_id}/cancel", response_model=schemas.Order)
-def cancel_order(
+async def cancel_order(
     order_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
 ):
     try:
-        cancelled_order = crud.cancel_order(db, order_id=order_id)
+        cancelled_order = await run_db(db, crud.cancel_order, order_id=order_id)
         if cancelled_order is None:
             raise HTTPException(status_code=404, detail="Order not found")
         return cancelled_order
@@ -1,84 +1,219 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
 
-from app import crud, models, schemas
-from app.auth import get_current_active_user
-from app.database import get_db
+from app import crud, export, ingest, pagination, schemas
+from app.auth import get_active_principal
+from app.database import get_db, get_read_db, run_db
+from app.serialization import FastJSONResponse, fast_json
 
 router = APIRouter(
     prefix="/products",
     tags=["products"],
 )
 
+# Rows validated and written per transaction by the bulk import
+BULK_IMPORT_CHUNK_SIZE = 1000
+# Rejected rows listed individually in a bulk import report
+BULK_IMPORT_MAX_ERRORS = 1000
 
-@router.get("/search", response_model=List[schemas.Product])
-def search_products(
+
+def _product_sort_key(product: dict):
+    return (product["id"],)
+
+
+def _search_sort_key(product: dict):
+    return product["search_rank"], product["id"]
+
+
+@router.get("/export")
+async def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    db=Depends(get_read_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
+):
+    """Stream the whole catalog as NDJSON or CSV"""
+    return export.export_response(
+        db,
+        crud.product_export_statement(),
+        format,
+        export.products_ndjson,
+        "products",
+    )
+
+
+@router.get(
+    "/search", response_model=List[schemas.Product], response_class=FastJSONResponse
+)
+async def search_products(
+    response: Response,
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     in_stock_only: bool = False,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db=Depends(get_read_db),
 ):
-    return crud.search_products(
+    products = await run_db(
         db,
+        crud.search_products,
         search=search,
         min_price=min_price,
         max_price=max_price,
         in_stock_only=in_stock_only,
         skip=skip,
         limit=limit,
+        after=pagination.search_key(cursor, ranked=bool(search)) if cursor else None,
     )
+    pagination.set_next_cursor(
+        response,
+        products,
+        limit,
+        key=_search_sort_key if search else _product_sort_key,
+    )
+    for product in products:
+        product.pop("search_rank", None)
+    return fast_json(products, response)
 
 
-@router.get("", response_model=List[schemas.Product])
-def get_products(
+@router.get("", response_model=List[schemas.Product], response_class=FastJSONResponse)
+async def get_products(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db=Depends(get_read_db),
 ):
 
-    products = crud.get_products(db, skip=skip, limit=limit)
-    return products
+    products = await run_db(
+        db,
+        crud.get_products,
+        skip=skip,
+        limit=limit,
+        after_id=pagination.product_key(cursor) if cursor else None,
+    )
+    pagination.set_next_cursor(response, products, limit, key=_product_sort_key)
+    return fast_json(products, response)
 
 
-@router.get("/low-stock", response_model=List[schemas.Product])
-def get_low_stock_products(db: Session = Depends(get_db)):
-    return crud.get_low_stock_products(db)
+@router.get(
+    "/low-stock", response_model=List[schemas.Product], response_class=FastJSONResponse
+)
+async def get_low_stock_products(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db=Depends(get_read_db),
+):
+    products = await run_db(
+        db,
+        crud.get_low_stock_products,
+        skip=skip,
+        limit=limit,
+        after_id=pagination.product_key(cursor) if cursor else None,
+    )
+    pagination.set_next_cursor(response, products, limit, key=_product_sort_key)
+    return fast_json(products, response)
 
 
 @router.get("/{product_id}", response_model=schemas.Product)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, db=Depends(get_db)):
 
-    product = crud.get_product(db, product_id=product_id)
+    product = await run_db(db, crud.get_product, product_id=product_id)
     if product is None:
         raise HTTPException(status_code=404, detail="Product not Found")
     return product
 
 
 @router.post("", response_model=schemas.Product, status_code=201)
-def create_product(
+async def create_product(
     product: schemas.ProductCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
 ):
 
-    return crud.create_product(db, product=product)
+    return await run_db(db, crud.create_product, product=product)
+
+
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_products(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
+):
+    """Create or update products by name from a streamed NDJSON or CSV body.
+
+    The format comes from ``format`` or the Content-Type header. Rows are
+    validated and written in chunks as the body arrives.
+    """
+    fmt = format or ingest.detect_format(request.headers.get("content-type"))
+    result = schemas.BulkImportResult()
+    chunk = []
+
+    def reject(line_number, errors):
+        result.failed += 1
+        if len(result.errors) < BULK_IMPORT_MAX_ERRORS:
+            result.errors.append(
+                schemas.BulkImportError(line=line_number, errors=errors)
+            )
+
+    async def flush():
+        inserted, updated = await run_db(db, crud.upsert_products, chunk)
+        result.inserted += inserted
+        result.updated += updated
+        chunk.clear()
+
+    async for line_number, record, error in ingest.iter_records(request.stream(), fmt):
+        if error is not None:
+            reject(line_number, [error])
+            continue
+        try:
+            chunk.append(schemas.ProductCreate.model_validate(record))
+        except ValidationError as e:
+            reject(
+                line_number,
+                [
+                    f"{'.'.join(map(str, err['loc']))}: {err['msg']}"
+                    for err in e.errors()
+                ],
+            )
+            continue
+        if len(chunk) >= BULK_IMPORT_CHUNK_SIZE:
+            await flush()
+
+    if chunk:
+        await flush()
+    return result
+
+
+@router.patch("/stock", response_model=schemas.StockAdjustmentResult)
+async def adjust_stock(
+    adjustments: List[schemas.StockAdjustment] = Body(..., min_length=1),
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
+):
+    """Apply stock deltas and absolute levels to many products in one transaction"""
+    try:
+        return await run_db(db, crud.adjust_stock, adjustments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.patch("/{product_id}", response_model=schemas.Product)
-def update_product(
+async def update_product(
     product_id: int,
     product_update: schemas.ProductUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
 ):
 
-    updated_product = crud.update_product(
-        db, product_id=product_id, product_update=product_update
+    updated_product = await run_db(
+        db, crud.update_product, product_id=product_id, product_update=product_update
     )
     if updated_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -86,12 +221,12 @@ def update_product(
 
 
 @router.delete("/{product_id}", response_model=schemas.Product)
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    db=Depends(get_db),
+    current_user: schemas.Principal = Depends(get_active_principal),
 ):
-    deleted_product = crud.delete_product(db, product_id=product_id)
+    deleted_product = await run_db(db, crud.delete_product, product_id=product_id)
     if deleted_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return deleted_product
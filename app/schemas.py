@@ -1,8 +1,17 @@
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
 from enum import Enum
-from typing import List, Optional
+from typing import Annotated, List, Literal, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, PlainSerializer, model_validator
+
+# An exact amount in dollars and cents (see app/money.py), written to JSON
+# as a number
+Money = Annotated[
+    Decimal,
+    Field(decimal_places=2),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
 
 
 class UserBase(BaseModel):
@@ -24,6 +33,14 @@ class User(UserBase):
         from_attributes = True
 
 
+class Principal(BaseModel):
+    """The authenticated caller, as far as authorization needs to know"""
+
+    id: int
+    username: str
+    is_active: bool
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -47,7 +64,7 @@ class ProductBase(BaseModel):
     name: str = Field(
         ..., min_length=3, max_length=512, description="Name of the product"
     )
-    price: float = Field(..., gt=0, description="Price of the product")
+    price: Money = Field(..., gt=0, description="Price of the product")
     stock: int = Field(..., ge=0, description="Number of product items in stock")
     low_stock_threshold: int = Field(
         default=10, ge=0, description="Alert when stock falls below this"
@@ -66,7 +83,7 @@ class ProductUpdate(BaseModel):
     name: Optional[str] = Field(
         None, min_length=3, max_length=512, description="Name of the product"
     )
-    price: Optional[float] = Field(None, gt=0, description="Price of the product")
+    price: Optional[Money] = Field(None, gt=0, description="Price of the product")
     stock: Optional[int] = Field(
         None, ge=0, description="Number of product items in stock"
     )
@@ -75,6 +92,57 @@ class ProductUpdate(BaseModel):
     )
 
 
+class BulkImportError(BaseModel):
+    line: int = Field(..., description="Line of the upload the row came from")
+    errors: List[str] = Field(..., description="Why the row was rejected")
+
+
+class BulkImportResult(BaseModel):
+    inserted: int = Field(0, description="Products created")
+    updated: int = Field(0, description="Existing products updated by name")
+    failed: int = Field(0, description="Rows rejected")
+    errors: List[BulkImportError] = Field(
+        [], description="Rejected rows (only the first ones are reported)"
+    )
+
+
+class StockAdjustment(BaseModel):
+    product_id: int = Field(..., description="ID of the product")
+    delta: Optional[int] = Field(None, description="Amount to add (or remove)")
+    absolute: Optional[int] = Field(None, ge=0, description="New stock level")
+
+    @model_validator(mode="after")
+    def check_one_change(self):
+        if (self.delta is None) == (self.absolute is None):
+            raise ValueError("Give exactly one of delta or absolute")
+        return self
+
+
+class StockLevel(BaseModel):
+    product_id: int
+    stock: int
+    low_stock_threshold: int
+
+
+class StockAdjustmentResult(BaseModel):
+    products: List[StockLevel] = Field(..., description="New stock levels")
+    low_stock: List[int] = Field(
+        ..., description="Products that fell to or below their threshold"
+    )
+    restocked: List[int] = Field(
+        ..., description="Products that rose back above their threshold"
+    )
+
+
+class StockEvent(BaseModel):
+    event: Literal["low_stock", "restocked"] = Field(
+        ..., description="Whether the product fell to or rose above its threshold"
+    )
+    product_id: int
+    stock: int
+    low_stock_threshold: int
+
+
 # ORDER ITEM SCHEMA
 class OrderItemBase(BaseModel):
     product_id: int = Field(..., description="ID of the product")
@@ -88,7 +156,7 @@ class OrderItemCreate(OrderItemBase):
 class OrderItem(OrderItemBase):
     id: int
     order_id: int
-    price_at_purchase: float
+    price_at_purchase: Money
 
     class Config:
         from_attributes = True
@@ -120,7 +188,7 @@ class Order(OrderBase):
     id: int = Field(..., description="Unique identifier of the order")
     order_date: datetime = Field(..., description="When the order was created")
     status: OrderStatus = Field(..., description="Current status of the order")
-    total_amount: float = Field(..., ge=0, description="Total order amount in dollars")
+    total_amount: Money = Field(..., ge=0, description="Total order amount in dollars")
     items: List[OrderItem] = []
 
     class Config:
@@ -145,3 +213,70 @@ class OrderUpdate(BaseModel):
 
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
+
+
+class OrderCancelRequest(BaseModel):
+    order_ids: List[int] = Field(
+        ..., min_length=1, max_length=10000, description="Orders to cancel"
+    )
+
+
+class OrderCancelResult(BaseModel):
+    cancelled: List[int] = Field(..., description="Orders cancelled now")
+    already_cancelled: List[int] = Field(
+        ..., description="Orders that were already cancelled"
+    )
+    not_cancellable: List[int] = Field(
+        ..., description="Delivered orders, which cannot be cancelled"
+    )
+    not_found: List[int] = Field(..., description="Order ids that do not exist")
+
+
+class OrderBatchCreate(BaseModel):
+    orders: List[OrderCreate] = Field(
+        ..., min_length=1, max_length=1000, description="Orders to create"
+    )
+
+
+class OrderBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the order in the request")
+    order: Optional[Order] = None
+    error: Optional[str] = Field(None, description="Why the order was not created")
+
+
+class OrderBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchItemResult]
+
+
+# ANALYTICS SCHEMAS
+class RevenueByDay(BaseModel):
+    day: date
+    status: OrderStatus
+    orders: int = Field(..., description="Orders placed that day now in this status")
+    revenue: Money
+
+    class Config:
+        from_attributes = True
+
+
+class ProductSales(BaseModel):
+    product_id: int
+    name: str
+    units: int = Field(..., description="Units sold, cancelled orders excluded")
+    revenue: Money
+
+    class Config:
+        from_attributes = True
+
+
+class SalesVelocity(BaseModel):
+    product_id: int
+    name: str
+    stock: int
+    units: int = Field(..., description="Units sold in the window")
+    units_per_day: float
+    days_of_stock: float = Field(
+        ..., description="Days until stock runs out at the current rate"
+    )
@@ -0,0 +1,130 @@
+"""Trigram product search.
+
+On PostgreSQL, ``products.name`` has a pg_trgm GIN index, so the database
+serves ``ILIKE '%term%'`` and ranks matches with ``similarity()``. Other
+databases (SQLite in development and tests) have no such index, so this
+module keeps an in-process n-gram index of product names instead. It is
+only kept current by writes made through this process.
+"""
+
+import re
+import threading
+from collections import defaultdict
+
+# Relevance is reported as an integer so it can be part of a pagination cursor
+RANK_SCALE = 10000
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> set:
+    """Trigrams of each word, padded like pg_trgm, used for ranking"""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def rank(term: str, name: str) -> int:
+    """pg_trgm style similarity between a search term and a name, scaled"""
+    term_grams, name_grams = trigrams(term), trigrams(name)
+    if not term_grams or not name_grams:
+        return 0
+    shared = len(term_grams & name_grams)
+    return round(shared / len(term_grams | name_grams) * RANK_SCALE)
+
+
+def _substrings(text: str) -> set:
+    """Raw 3-character substrings, used to find substring match candidates"""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class NGramIndex:
+    """Maps 3-character substrings of product names to product ids"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._postings = defaultdict(set)
+        # Names (None when removed) written before the index is built. They
+        # are replayed over the rows it is built from, which may come from a
+        # replica that has not caught up with them yet.
+        self._pending = {}
+        self.loaded = False
+
+    def load(self, rows):
+        """Build the index from (id, name) rows unless it is already built"""
+        with self._lock:
+            if self.loaded:
+                return
+            for product_id, name in rows:
+                self._add(product_id, name)
+            for product_id, name in self._pending.items():
+                self._remove(product_id)
+                if name is not None:
+                    self._add(product_id, name)
+            self._pending.clear()
+            self.loaded = True
+
+    def add(self, product_id: int, name: str):
+        with self._lock:
+            if self.loaded:
+                self._remove(product_id)
+                self._add(product_id, name)
+            else:
+                self._pending[product_id] = name
+
+    def remove(self, product_id: int):
+        with self._lock:
+            if self.loaded:
+                self._remove(product_id)
+            else:
+                self._pending[product_id] = None
+
+    def clear(self):
+        with self._lock:
+            self._names.clear()
+            self._postings.clear()
+            self._pending.clear()
+            self.loaded = False
+
+    def search(self, term: str):
+        """Ids of names containing ``term``, as (rank, id) sorted best first"""
+        needle = term.lower()
+        with self._lock:
+            grams = _substrings(needle)
+            if grams:
+                postings = sorted(
+                    (self._postings.get(g, set()) for g in grams), key=len
+                )
+                candidates = set.intersection(*postings)
+            else:
+                candidates = self._names.keys()
+            matches = [
+                (rank(term, self._names[product_id]), product_id)
+                for product_id in candidates
+                if needle in self._names[product_id]
+            ]
+        matches.sort(key=lambda match: (-match[0], match[1]))
+        return matches
+
+    def _add(self, product_id, name):
+        name = name.lower()
+        self._names[product_id] = name
+        for gram in _substrings(name):
+            self._postings[gram].add(product_id)
+
+    def _remove(self, product_id):
+        name = self._names.pop(product_id, None)
+        if name is None:
+            return
+        for gram in _substrings(name):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[gram]
+
+
+product_index = NGramIndex()
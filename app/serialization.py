@@ -0,0 +1,29 @@
+"""Fast JSON responses for the listing endpoints.
+
+Listings read plain column tuples in crud and return them as dicts, which
+are encoded here with orjson. Returning the response directly skips
+FastAPI's response_model validation, which for a page of ORM objects costs
+more than the query; the routes keep ``response_model`` for the OpenAPI
+schema, and the dicts carry exactly its fields.
+"""
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+def fast_json(content, response: Response = None) -> FastJSONResponse:
+    """Encode ``content`` as is, keeping headers set on the injected ``response``.
+
+    FastAPI only copies those headers (e.g. X-Next-Cursor) onto responses it
+    builds itself.
+    """
+    fast = FastJSONResponse(content)
+    if response is not None:
+        fast.raw_headers.extend(response.headers.raw)
+    return fast
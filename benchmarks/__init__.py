@@ -0,0 +1,13 @@
+"""Benchmarks for the SyncStock hot paths.
+
+Each module is runnable on its own, e.g. ``python -m benchmarks.order_listing``.
+They run against BENCH_DATABASE_URL (an in-memory SQLite database by default)
+and create and drop their own tables, so never point them at a real database.
+"""
+
+import os
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+
+# app.database builds its engine at import time
+os.environ.setdefault("DATABASE_URL", BENCH_DATABASE_URL)
@@ -0,0 +1,123 @@
+"""Authenticated request latency with and without the user lookup.
+
+    python -m benchmarks.auth_latency
+
+Times ``PATCH /products/{id}`` under three setups: every request loads the
+user from the database (no user cache), users come from the user cache, and
+tokens carry user claims (TOKEN_USER_CLAIMS) so no lookup happens at all.
+"""
+
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# benchmarks must be imported before app: it points DATABASE_URL at the
+# benchmark database before app.database builds its engine
+from benchmarks import BENCH_DATABASE_URL  # isort: skip
+from app import auth
+from app.cache import user_cache
+from app.database import Base, get_db
+from app.main import app
+
+REQUESTS = 500
+
+USER = {"email": "bench@example.com", "username": "benchuser", "password": "benchpass1"}
+
+
+def make_client(engine):
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def login(client):
+    form = {"username": USER["username"], "password": USER["password"]}
+    token = client.post("/auth/login", data=form).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def measure(client, engine, headers, product_id):
+    queries = 0
+
+    def count(*args):
+        nonlocal queries
+        queries += 1
+
+    timings = []
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for i in range(REQUESTS):
+            start = time.perf_counter()
+            response = client.patch(
+                f"/products/{product_id}", json={"stock": i}, headers=headers
+            )
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    timings.sort()
+    return (
+        statistics.median(timings),
+        timings[int(len(timings) * 0.95)],
+        queries / REQUESTS,
+    )
+
+
+def main():
+    engine = create_engine(
+        BENCH_DATABASE_URL,
+        connect_args=(
+            {"check_same_thread": False}
+            if BENCH_DATABASE_URL.startswith("sqlite")
+            else {}
+        ),
+        poolclass=StaticPool if BENCH_DATABASE_URL.startswith("sqlite") else None,
+    )
+    Base.metadata.create_all(bind=engine)
+    backend = user_cache.backend
+    try:
+        with make_client(engine) as client:
+            client.post("/auth/register", json=USER)
+            headers = login(client)
+            product = {"name": "Bench Product", "price": 1.0, "stock": 1}
+            product_id = client.post("/products", json=product, headers=headers).json()[
+                "id"
+            ]
+
+            results = {}
+            user_cache.backend = None
+            results["no user cache"] = measure(client, engine, headers, product_id)
+
+            user_cache.backend = backend
+            results["user cache"] = measure(client, engine, headers, product_id)
+
+            auth.TOKEN_USER_CLAIMS = True
+            claims_headers = login(client)
+            results["token claims"] = measure(
+                client, engine, claims_headers, product_id
+            )
+    finally:
+        auth.TOKEN_USER_CLAIMS = False
+        user_cache.backend = backend
+        app.dependency_overrides.clear()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+    print(f"PATCH /products/{{id}}, {REQUESTS} requests\n")
+    print(f"{'setup':<14}  {'p50 ms':>7}  {'p95 ms':>7}  {'queries/req':>11}")
+    for name, (p50, p95, queries) in results.items():
+        print(f"{name:<14}  {p50 * 1000:>7.2f}  {p95 * 1000:>7.2f}  {queries:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Throughput, latency percentiles and queries per request for the hot paths.
+
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --sizes 1000,10000,100000 --json after.json
+    python -m benchmarks.hot_paths --baseline before.json
+
+For each data size (products and orders) the database is seeded with
+``benchmarks.seed`` and every scenario is driven through the ASGI app, so
+routing, validation, serialization and the database all count. Save a run
+with ``--json`` before a change and pass it as ``--baseline`` afterwards to
+see the difference in p50 latency and queries per request.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# benchmarks must be imported before app: it points DATABASE_URL at the
+# benchmark database before app.database builds its engine
+from benchmarks import BENCH_DATABASE_URL  # isort: skip
+from app.cache import product_cache, user_cache
+from app.database import Base, get_db
+from app.instrumentation import count_queries
+from app.main import app
+from app.passwords import password_hasher
+from app.search import product_index
+from benchmarks.seed import ADJECTIVES, NOUNS, customer_email, seed
+
+USER = {"email": "bench@example.com", "username": "benchuser", "password": "benchpass1"}
+WARMUP = 10
+# Orders per POST /orders/batch request
+BATCH_ORDERS = 100
+SEARCH_TERMS = [*NOUNS, *(f"{a} {n}" for a, n in zip(ADJECTIVES, NOUNS))]
+FILTER_STATUSES = ["pending", "processing", "shipped", None]
+
+
+def percentile(timings, p):
+    """Nearest-rank percentile of already sorted timings"""
+    return timings[max(0, math.ceil(p / 100 * len(timings)) - 1)]
+
+
+def scenarios(product_ids, rng):
+    """Request factories by name; each call returns (method, url, json)"""
+
+    def order_body():
+        items = rng.sample(product_ids, rng.randint(1, 5))
+        return {
+            "customer_name": "Bench Customer",
+            "customer_email": "bench-customer@example.com",
+            "customer_address": "1 Benchmark Way, City, State 12345",
+            "items": [{"product_id": p, "quantity": 1} for p in items],
+        }
+
+    def create_order():
+        return "POST", "/orders", order_body()
+
+    def create_order_batch():
+        body = {"orders": [order_body() for _ in range(BATCH_ORDERS)]}
+        return "POST", "/orders/batch", body
+
+    terms = itertools.cycle(SEARCH_TERMS)
+
+    def search_products():
+        return "GET", f"/products/search?search={next(terms)}&limit=20", None
+
+    customers = itertools.count()
+    statuses = itertools.cycle(FILTER_STATUSES)
+
+    def filter_orders():
+        url = f"/orders/filter?customer_email={customer_email(next(customers))}"
+        status = next(statuses)
+        if status:
+            url += f"&status={status}"
+        return "GET", url + "&limit=50", None
+
+    def list_orders():
+        return "GET", "/orders?limit=50", None
+
+    def revenue_report():
+        return "GET", "/analytics/revenue", None
+
+    return {
+        "POST /orders": create_order,
+        f"POST /orders/batch ({BATCH_ORDERS})": create_order_batch,
+        "GET /products/search": search_products,
+        "GET /orders/filter": filter_orders,
+        "GET /orders": list_orders,
+        "GET /analytics/revenue": revenue_report,
+    }
+
+
+async def run_scenario(client, engine, make_request, requests, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one():
+        method, url, body = make_request()
+        async with limit:
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            timings.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f"{method} {url}: {response.status_code} {response.text}"
+            )
+
+    for _ in range(WARMUP):
+        await one()
+    timings.clear()
+
+    with count_queries(engine) as queries:
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    timings.sort()
+    return {
+        "requests": requests,
+        "throughput": requests / elapsed,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "queries_per_request": queries.count / requests,
+    }
+
+
+IN_MEMORY = BENCH_DATABASE_URL in ("sqlite://", "sqlite:///:memory:")
+
+
+def make_engine():
+    if IN_MEMORY:
+        # One shared connection, or each thread would get an empty database
+        return create_engine(
+            BENCH_DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    return create_engine(BENCH_DATABASE_URL)
+
+
+async def run_size(size, requests, concurrency):
+    engine = make_engine()
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with Session() as db:
+            product_ids = seed(db, products=size, orders=size)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            await client.post("/auth/register", json=USER)
+            form = {"username": USER["username"], "password": USER["password"]}
+            token = (await client.post("/auth/login", data=form)).json()
+            client.headers["Authorization"] = f"Bearer {token['access_token']}"
+
+            rng = random.Random(size)
+            return {
+                name: await run_scenario(
+                    client, engine, make_request, requests, concurrency
+                )
+                for name, make_request in scenarios(product_ids, rng).items()
+            }
+    finally:
+        app.dependency_overrides.clear()
+        product_index.clear()
+        product_cache.clear()
+        user_cache.clear()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+
+def print_results(results, baseline):
+    header = (
+        f"{'size':>7}  {'scenario':<24}  {'req/s':>8}  {'p50 ms':>7}  "
+        f"{'p95 ms':>7}  {'p99 ms':>7}  {'queries':>7}"
+    )
+    if baseline:
+        header += f"  {'p50 vs base':>11}  {'queries vs base':>15}"
+    print(header)
+    for size, scenario_results in results.items():
+        for name, r in scenario_results.items():
+            line = (
+                f"{size:>7}  {name:<24}  {r['throughput']:>8.1f}  {r['p50_ms']:>7.2f}  "
+                f"{r['p95_ms']:>7.2f}  {r['p99_ms']:>7.2f}  "
+                f"{r['queries_per_request']:>7.1f}"
+            )
+            base = baseline.get(size, {}).get(name)
+            if base:
+                change = (r["p50_ms"] / base["p50_ms"] - 1) * 100
+                queries = r["queries_per_request"] - base["queries_per_request"]
+                line += f"  {change:>+10.1f}%  {queries:>+15.1f}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000",
+        help="comma separated catalog/order counts to seed (default 1000,10000)",
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="requests in flight at once; use a file or server database above 1",
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by --json")
+    args = parser.parse_args()
+    if args.concurrency > 1 and IN_MEMORY:
+        parser.error("--concurrency above 1 needs a file or server BENCH_DATABASE_URL")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Hash in the threadpool; a one-off login should not start worker processes
+    password_hasher.workers = 0
+
+    results = {}
+    for size in args.sizes.split(","):
+        results[size] = asyncio.run(
+            run_size(int(size), args.requests, args.concurrency)
+        )
+
+    print(f"{BENCH_DATABASE_URL}, {args.requests} requests per scenario\n")
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Compare order listing strategies for orders with 1, 10 and 100 items.
+
+    python -m benchmarks.order_listing
+
+``joinedload`` with LIMIT wraps the page in a subquery and returns one wide
+row per order item, which SQLAlchemy then deduplicates in Python. The
+two-phase listing behind ``crud.get_orders`` selects the page of orders, then
+the items for exactly those ids.
+"""
+
+import statistics
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import joinedload, sessionmaker
+
+# benchmarks must be imported before app: it points DATABASE_URL at the
+# benchmark database before app.database builds its engine
+from benchmarks import BENCH_DATABASE_URL  # isort: skip
+from app import crud, models
+from app.database import Base
+
+ORDERS = 200
+PAGE_SIZE = 100
+REPEAT = 20
+ITEM_COUNTS = (1, 10, 100)
+
+
+@contextmanager
+def record_statements(engine):
+    """Collect every (statement, parameters) pair sent to the database"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def transferred(engine, statements):
+    """Re-run recorded statements and measure the rows and bytes they return"""
+    rows = size = 0
+    raw = engine.raw_connection()
+    try:
+        for statement, parameters in statements:
+            cursor = raw.cursor()
+            cursor.execute(statement, parameters)
+            for row in cursor.fetchall():
+                rows += 1
+                size += sum(len(str(value)) for value in row)
+            cursor.close()
+    finally:
+        raw.close()
+    return rows, size
+
+
+def joined_listing(db):
+    return (
+        db.query(models.Order)
+        .options(joinedload(models.Order.items))
+        .order_by(models.Order.order_date, models.Order.id)
+        .limit(PAGE_SIZE)
+        .all()
+    )
+
+
+def two_phase_listing(db):
+    return crud.get_orders(db, limit=PAGE_SIZE)
+
+
+STRATEGIES = {"joinedload": joined_listing, "two-phase": two_phase_listing}
+
+
+def seed(db, items_per_order):
+    products = [
+        models.Product(name=f"Bench Product {i}", price_cents=999, stock=1_000_000)
+        for i in range(items_per_order)
+    ]
+    db.add_all(products)
+    db.flush()
+    for i in range(ORDERS):
+        order = models.Order(
+            customer_name=f"Bench Customer {i}",
+            customer_email=f"bench{i}@example.com",
+            customer_address=f"{i} Benchmark Way, City, State 12345",
+            total_cents=999 * items_per_order,
+        )
+        order.items = [
+            models.OrderItem(product_id=p.id, quantity=1, price_at_purchase_cents=999)
+            for p in products
+        ]
+        db.add(order)
+    db.commit()
+
+
+def run(items_per_order):
+    engine = create_engine(BENCH_DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    results = {}
+    try:
+        with Session() as db:
+            seed(db, items_per_order)
+
+        for name, listing in STRATEGIES.items():
+            timings = []
+            for _ in range(REPEAT):
+                with Session() as db, record_statements(engine) as statements:
+                    start = time.perf_counter()
+                    orders = listing(db)
+                    timings.append(time.perf_counter() - start)
+            assert len(orders) == PAGE_SIZE
+            rows, size = transferred(engine, statements)
+            results[name] = (len(statements), rows, size, statistics.median(timings))
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+    return results
+
+
+def main():
+    print(f"{PAGE_SIZE} orders per page, median of {REPEAT} runs\n")
+    print(
+        f"{'items/order':>11}  {'strategy':<10}  {'queries':>7}  {'rows':>7}  {'bytes':>9}  {'ms':>8}"
+    )
+    for items_per_order in ITEM_COUNTS:
+        for name, (queries, rows, size, seconds) in run(items_per_order).items():
+            print(
+                f"{items_per_order:>11}  {name:<10}  {queries:>7}  {rows:>7}  "
+                f"{size:>9}  {seconds * 1000:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Generate a catalog and order history for benchmarks.
+
+    python -m benchmarks.seed --products 10000 --orders 10000
+
+Rows are written with multi-row INSERTs through the app's models, so seeding
+100k rows takes seconds. Data is deterministic for a given size: names are
+drawn from a small vocabulary so searches have realistic match counts, and
+orders spread over 90 days and a few hundred customers.
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+# benchmarks must be imported before app: it points DATABASE_URL at the
+# benchmark database before app.database builds its engine
+from benchmarks import BENCH_DATABASE_URL  # isort: skip
+from app import crud, models
+from app.database import Base
+from app.schemas import OrderStatus
+
+ADJECTIVES = ["Classic", "Premium", "Organic", "Vintage", "Compact", "Deluxe"]
+NOUNS = ["Shirt", "Mug", "Lamp", "Backpack", "Notebook", "Candle", "Blanket"]
+CUSTOMERS = 500
+BATCH_SIZE = 5000
+
+
+def product_name(i: int) -> str:
+    adjective = ADJECTIVES[i % len(ADJECTIVES)]
+    noun = NOUNS[(i // len(ADJECTIVES)) % len(NOUNS)]
+    return f"{adjective} {noun} {i}"
+
+
+def customer_email(i: int) -> str:
+    return f"customer{i % CUSTOMERS}@example.com"
+
+
+def _insert(db, model, rows):
+    """Insert in batches, returning the new primary keys in row order"""
+    ids = []
+    for start in range(0, len(rows), BATCH_SIZE):
+        result = db.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[start : start + BATCH_SIZE],
+        )
+        ids.extend(result.scalars())
+    return ids
+
+
+def seed(db, products: int, orders: int, items_per_order: int = 3, seed: int = 0):
+    """Add ``products`` products and ``orders`` orders; returns the product ids"""
+    rng = random.Random(seed)
+    product_rows = [
+        {
+            "name": product_name(i),
+            "price_cents": rng.randint(100, 20_000),
+            "stock": 1_000_000,
+            "low_stock_threshold": 10,
+        }
+        for i in range(products)
+    ]
+    product_ids = _insert(db, models.Product, product_rows)
+    prices = dict(zip(product_ids, (row["price_cents"] for row in product_rows)))
+
+    now = datetime.now(timezone.utc)
+    statuses = [status.value for status in OrderStatus]
+    order_rows, order_items = [], []
+    for i in range(orders):
+        items = rng.sample(product_ids, min(items_per_order, len(product_ids)))
+        order_items.append(items)
+        order_rows.append(
+            {
+                "customer_name": f"Customer {i % CUSTOMERS}",
+                "customer_email": customer_email(i),
+                "customer_address": f"{i} Benchmark Way, City, State 12345",
+                "order_date": now - timedelta(minutes=rng.randrange(90 * 24 * 60)),
+                "status": rng.choice(statuses),
+                "total_cents": sum(prices[p] for p in items),
+            }
+        )
+    order_ids = _insert(db, models.Order, order_rows)
+
+    item_rows = [
+        {
+            "order_id": order_id,
+            "product_id": product_id,
+            "quantity": 1,
+            "price_at_purchase_cents": prices[product_id],
+        }
+        for order_id, items in zip(order_ids, order_items)
+        for product_id in items
+    ]
+    for start in range(0, len(item_rows), BATCH_SIZE):
+        db.execute(insert(models.OrderItem), item_rows[start : start + BATCH_SIZE])
+
+    db.commit()
+    # The rows above bypass create_order, which keeps the rollups current
+    crud.rebuild_order_rollups(db)
+    return product_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=10_000)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine(BENCH_DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        seed(db, args.products, args.orders, args.items_per_order)
+    engine.dispose()
+    print(f"Seeded {args.products} products and {args.orders} orders")
+
+
+if __name__ == "__main__":
+    main()
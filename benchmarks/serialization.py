@@ -0,0 +1,111 @@
+"""Compare the cost of turning 1,000 orders into a JSON response body.
+
+    python -m benchmarks.serialization
+
+``orm + pydantic`` is the path FastAPI takes for ``response_model`` routes:
+ORM objects are hydrated, validated into ``schemas.Order`` with
+``from_attributes`` and dumped by pydantic. ``rows + orjson`` is the listing
+path behind ``GET /orders``: ``crud.get_orders`` returns dicts built from row
+tuples and ``FastJSONResponse`` encodes them with orjson. Fetch and encode
+are timed separately so the database share stays visible.
+"""
+
+import statistics
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import selectinload, sessionmaker
+
+# benchmarks must be imported before app: it points DATABASE_URL at the
+# benchmark database before app.database builds its engine
+from benchmarks import BENCH_DATABASE_URL  # isort: skip
+from app import crud, models, schemas
+from app.database import Base
+from app.serialization import FastJSONResponse
+from benchmarks.seed import seed
+
+ORDERS = 1000
+REPEAT = 20
+ITEM_COUNTS = (1, 3, 10)
+
+orders_adapter = TypeAdapter(List[schemas.Order])
+
+
+def orm_fetch(db):
+    return (
+        db.query(models.Order)
+        .options(selectinload(models.Order.items))
+        .order_by(models.Order.order_date, models.Order.id)
+        .limit(ORDERS)
+        .all()
+    )
+
+
+def orm_encode(orders):
+    validated = orders_adapter.validate_python(orders, from_attributes=True)
+    return orders_adapter.dump_json(validated)
+
+
+def rows_fetch(db):
+    return crud.get_orders(db, limit=ORDERS)
+
+
+def rows_encode(orders):
+    return FastJSONResponse(orders).body
+
+
+STRATEGIES = {
+    "orm + pydantic": (orm_fetch, orm_encode),
+    "rows + orjson": (rows_fetch, rows_encode),
+}
+
+
+def run(items_per_order):
+    engine = create_engine(BENCH_DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    results = {}
+    try:
+        with Session() as db:
+            seed(db, products=100, orders=ORDERS, items_per_order=items_per_order)
+
+        for name, (fetch, encode) in STRATEGIES.items():
+            fetch_timings, encode_timings = [], []
+            for _ in range(REPEAT):
+                with Session() as db:
+                    start = time.perf_counter()
+                    orders = fetch(db)
+                    fetched = time.perf_counter()
+                    body = encode(orders)
+                    fetch_timings.append(fetched - start)
+                    encode_timings.append(time.perf_counter() - fetched)
+            assert len(orders) == ORDERS
+            results[name] = (
+                statistics.median(fetch_timings),
+                statistics.median(encode_timings),
+                len(body),
+            )
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+    return results
+
+
+def main():
+    print(f"{ORDERS} orders per response, median of {REPEAT} runs\n")
+    print(
+        f"{'items/order':>11}  {'strategy':<14}  {'fetch ms':>8}  {'encode ms':>9}  "
+        f"{'total ms':>8}  {'bytes':>9}"
+    )
+    for items_per_order in ITEM_COUNTS:
+        for name, (fetch, encode, size) in run(items_per_order).items():
+            print(
+                f"{items_per_order:>11}  {name:<14}  {fetch * 1000:>8.2f}  "
+                f"{encode * 1000:>9.2f}  {(fetch + encode) * 1000:>8.2f}  {size:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,26 @@
 """Reusable test setup code"""
 
+import os
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
-from app.database import Base, get_db
+from app.cache import product_cache, user_cache
+from app.database import Base, async_database_url, get_db
+from app.instrumentation import count_queries
 from app.main import app
+from app.passwords import password_hasher
+from app.search import product_index
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# A scratch database (e.g. a local Postgres) for the tests that need a server
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -20,6 +31,22 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Drop in-process caches so no state leaks between test databases"""
+    yield
+    product_index.clear()
+    product_cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def threadpool_password_hashing(monkeypatch):
+    """Hash in the threadpool; starting the process pool for every test
+    client would dominate the suite's runtime"""
+    monkeypatch.setattr(password_hasher, "workers", 0)
+
+
 @pytest.fixture(scope="function")
 def db_session():
     """Make a fresh database for each test"""
@@ -32,6 +59,68 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 
+@contextmanager
+def scratch_sessionmaker(url: str):
+    """Sessions on ``url`` with the schema created, dropped again afterwards"""
+    connect_args = (
+        {"check_same_thread": False, "timeout": 30} if url.startswith("sqlite") else {}
+    )
+    scratch_engine = create_engine(url, connect_args=connect_args)
+    Base.metadata.create_all(bind=scratch_engine)
+    try:
+        yield sessionmaker(autocommit=False, autoflush=False, bind=scratch_engine)
+    finally:
+        Base.metadata.drop_all(bind=scratch_engine)
+        scratch_engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def concurrent_sessionmaker(tmp_path):
+    """Sessions on a database that accepts real concurrent connections.
+
+    Uses TEST_DATABASE_URL when set, otherwise a file-backed SQLite database
+    in the test's temp directory.
+    """
+    url = TEST_DATABASE_URL or f"sqlite:///{tmp_path / 'concurrent.db'}"
+    with scratch_sessionmaker(url) as concurrent_sessionmaker:
+        yield concurrent_sessionmaker
+
+
+@pytest.fixture(scope="function")
+def postgres_sessionmaker():
+    """Sessions on TEST_DATABASE_URL; skips the test unless it is PostgreSQL"""
+    if (
+        not TEST_DATABASE_URL
+        or make_url(TEST_DATABASE_URL).get_backend_name() != "postgresql"
+    ):
+        pytest.skip("Set TEST_DATABASE_URL to a PostgreSQL database to run this test")
+    with scratch_sessionmaker(TEST_DATABASE_URL) as postgres_sessionmaker:
+        yield postgres_sessionmaker
+
+
+@pytest.fixture
+def query_budget():
+    """Fail when a block runs more SQL statements than allowed.
+
+        with query_budget(5):
+            client.post("/orders", ...)
+
+    Yields the counter, so tests can also compare counts between calls.
+    """
+
+    @contextmanager
+    def budget(max_queries: int):
+        with count_queries(engine) as counter:
+            yield counter
+        assert (
+            counter.count <= max_queries
+        ), f"{counter.count} SQL statements, budget {max_queries}:\n" + "\n".join(
+            counter.statements
+        )
+
+    return budget
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """Create a test client with the test database"""
@@ -48,6 +137,30 @@ def client(db_session):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture(scope="function")
+def async_client(tmp_path):
+    """Create a test client whose requests use AsyncSession (async mode)"""
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+
+    # NullPool: connections must not outlive the event loop that opened them
+    async_engine = create_async_engine(async_database_url(url), poolclass=NullPool)
+    AsyncTestingSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+    sync_engine.dispose()
+
+
 @pytest.fixture
 def test_user(client):
     """Create a test user and return credentials"""
@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import func
+
+from app import crud, models, schemas
+
+
+def place_order(client, auth_headers, items):
+    order_data = {
+        "customer_name": "Report Customer",
+        "customer_email": "report@example.com",
+        "customer_address": "1 Report St, City, State 12345",
+        "items": [{"product_id": p, "quantity": q} for p, q in items],
+    }
+    response = client.post("/orders", json=order_data, headers=auth_headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def rollup_totals(db):
+    """Rollup rows with their shards summed, keys with all-zero sums left out"""
+    totals = []
+    for model, key in (
+        (models.OrderDailyStats, models.OrderDailyStats.status),
+        (models.ProductDailySales, models.ProductDailySales.product_id),
+    ):
+        count = model.orders if model is models.OrderDailyStats else model.units
+        rows = (
+            db.query(model.day, key, func.sum(count), func.sum(model.revenue_cents))
+            .group_by(model.day, key)
+            .having(func.sum(count) != 0)
+            .order_by(model.day, key)
+        )
+        totals.append([tuple(row) for row in rows])
+    return totals
+
+
+def test_analytics_follow_order_changes(client, auth_headers, test_product):
+    """Test that revenue and sales reports track creation, status and cancellation"""
+    response = client.post(
+        "/products",
+        json={"name": "Second Product", "price": 2.50, "stock": 100},
+        headers=auth_headers,
+    )
+    second = response.json()
+    first_id = test_product["id"]
+
+    kept = place_order(client, auth_headers, [(first_id, 2), (second["id"], 4)])
+    shipped = place_order(client, auth_headers, [(first_id, 1)])
+    cancelled = place_order(client, auth_headers, [(second["id"], 10)])
+    client.patch(
+        f"/orders/{shipped['id']}/status",
+        json={"status": "shipped"},
+        headers=auth_headers,
+    )
+    client.delete(f"/orders/{cancelled['id']}/cancel", headers=auth_headers)
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    revenue = client.get(f"/analytics/revenue?start={today}&end={today}").json()
+    assert {r["status"]: (r["orders"], r["revenue"]) for r in revenue} == {
+        "cancelled": (1, cancelled["total_amount"]),
+        "pending": (1, kept["total_amount"]),
+        "shipped": (1, shipped["total_amount"]),
+    }
+    response = client.get("/analytics/revenue?status=shipped")
+    assert [r["orders"] for r in response.json()] == [1]
+    assert client.get("/analytics/revenue?end=2000-01-01").json() == []
+
+    top = client.get("/analytics/top-products").json()
+    assert [(p["product_id"], p["units"]) for p in top] == [
+        (second["id"], 4),
+        (first_id, 3),
+    ]
+    assert top[1]["revenue"] == test_product["price"] * 3
+
+    response = client.get(f"/analytics/sales-velocity?days=10&product_id={first_id}")
+    (velocity,) = response.json()
+    assert velocity["units_per_day"] == 0.3
+    assert velocity["stock"] == test_product["stock"] - 3
+    assert velocity["days_of_stock"] == pytest.approx(velocity["stock"] / 0.3)
+
+
+def test_money_sums_are_exact(client, auth_headers, db_session):
+    """Test that totals and revenue add up in whole cents, without float drift"""
+    response = client.post(
+        "/products",
+        json={"name": "Dime Product", "price": 0.1, "stock": 100},
+        headers=auth_headers,
+    )
+    product_id = response.json()["id"]
+
+    order = place_order(client, auth_headers, [(product_id, 3)])
+    for _ in range(2):
+        place_order(client, auth_headers, [(product_id, 1)])
+
+    # 0.1 * 3 and 0.1 + 0.1 + 0.1 are both 0.30000000000000004 in floats
+    assert order["total_amount"] == 0.3
+    (revenue,) = client.get("/analytics/revenue").json()
+    assert revenue["revenue"] == 0.5
+    (top,) = client.get("/analytics/top-products").json()
+    assert (top["units"], top["revenue"]) == (5, 0.5)
+    assert rollup_totals(db_session)[0][0][2:] == (3, 50)
+
+
+def test_rebuild_matches_incremental_rollups(
+    client, auth_headers, test_product, db_session
+):
+    """Test that rebuilding the rollups from orders gives the same rows"""
+    place_order(client, auth_headers, [(test_product["id"], 2)])
+    cancelled = place_order(client, auth_headers, [(test_product["id"], 1)])
+    client.delete(f"/orders/{cancelled['id']}/cancel", headers=auth_headers)
+
+    incremental = rollup_totals(db_session)
+    crud.rebuild_order_rollups(db_session)
+    db_session.expire_all()
+
+    assert rollup_totals(db_session) == incremental
+    assert incremental[1][0][2:] == (2, 2 * 2999)
+
+
+def test_concurrent_orders_and_status_changes_keep_rollups(concurrent_sessionmaker):
+    """Test that parallel creations and opposite status changes on the same
+    day all succeed and leave the rollups matching a rebuild"""
+    setup_db = concurrent_sessionmaker()
+    product = models.Product(name="Rollup Item", price=2.5, stock=1000)
+    setup_db.add(product)
+    setup_db.commit()
+    product_id = product.id
+    setup_db.close()
+
+    order = schemas.OrderCreate(
+        customer_name="Rollup Customer",
+        customer_email="rollup@example.com",
+        customer_address="1 Rollup St, City, State 12345",
+        items=[{"product_id": product_id, "quantity": 1}],
+    )
+
+    def create(_=None):
+        db = concurrent_sessionmaker()
+        try:
+            return crud.create_order(db, order=order).id
+        finally:
+            db.close()
+
+    shipped = [create() for _ in range(10)]
+    db = concurrent_sessionmaker()
+    for order_id in shipped:
+        crud.update_order_status(db, order_id, schemas.OrderStatus.SHIPPED.value)
+    db.close()
+    pending = [create() for _ in range(10)]
+
+    def change(args):
+        order_id, status = args
+        db = concurrent_sessionmaker()
+        try:
+            return crud.update_order_status(db, order_id, status.value).status
+        finally:
+            db.close()
+
+    # pending -> shipped and shipped -> pending touch the same two rollup
+    # keys in opposite directions
+    changes = [(i, schemas.OrderStatus.SHIPPED) for i in pending]
+    changes += [(i, schemas.OrderStatus.PENDING) for i in shipped]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        created = pool.map(create, range(20))
+        changed = pool.map(change, changes)
+        assert len(list(created)) == 20
+        assert len(list(changed)) == 20
+
+    check_db = concurrent_sessionmaker()
+    try:
+        incremental = rollup_totals(check_db)
+        statuses = {status: orders for _, status, orders, _ in incremental[0]}
+        assert statuses == {"pending": 30, "shipped": 10}
+        crud.rebuild_order_rollups(check_db)
+        assert rollup_totals(check_db) == incremental
+    finally:
+        check_db.close()
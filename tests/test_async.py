@@ -0,0 +1,59 @@
+def test_async_order_flow(async_client):
+    """Test the product and order endpoints on an AsyncSession"""
+    user_data = {
+        "email": "async@example.com",
+        "username": "asyncuser",
+        "password": "asyncpass123",
+    }
+    response = async_client.post("/auth/register", json=user_data)
+    assert response.status_code == 201
+
+    login_data = {"username": user_data["username"], "password": user_data["password"]}
+    response = async_client.post("/auth/login", data=login_data)
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = async_client.get("/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == user_data["username"]
+
+    product_data = {
+        "name": "Async Product",
+        "price": 12.50,
+        "stock": 20,
+        "low_stock_threshold": 5,
+    }
+    response = async_client.post("/products", json=product_data, headers=headers)
+    assert response.status_code == 201
+    product = response.json()
+
+    order_data = {
+        "customer_name": "Async Customer",
+        "customer_email": "asynccustomer@example.com",
+        "customer_address": "1 Event Loop Ave, City, State 12345",
+        "items": [{"product_id": product["id"], "quantity": 4}],
+    }
+    response = async_client.post("/orders", json=order_data, headers=headers)
+    assert response.status_code == 201
+    order = response.json()
+    assert order["total_amount"] == 50.0
+    assert len(order["items"]) == 1
+
+    response = async_client.get(f"/products/{product['id']}")
+    assert response.json()["stock"] == 16
+
+    response = async_client.delete(f"/orders/{order['id']}/cancel", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert len(response.json()["items"]) == 1
+
+    response = async_client.get("/orders")
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    response = async_client.get("/orders/export", headers=headers)
+    assert response.status_code == 200
+    assert response.text.count("\n") == 1
+
+    response = async_client.get(f"/products/{product['id']}")
+    assert response.json()["stock"] == 20
@@ -1,3 +1,13 @@
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+
+from jose import jwt
+
+from app import auth, crud
+from app.passwords import PasswordHasher
+from app.routers import auth as auth_router
+
+
 def test_register_user(client):
     """Test user registration"""
     user_data = {
@@ -83,3 +93,102 @@ def test_get_current_user_without_token(client):
     response = client.get("/auth/me")
 
     assert response.status_code == 401
+
+
+def test_current_user_is_cached(client, auth_headers):
+    """Test that repeated authenticated requests reuse the cached user"""
+    client.get("/auth/me", headers=auth_headers)
+    before = client.get("/metrics/cache").json()["users"]
+
+    response = client.get("/auth/me", headers=auth_headers)
+    assert response.status_code == 200
+
+    after = client.get("/metrics/cache").json()["users"]
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+
+def test_deactivated_user_is_rejected(client, db_session, test_user, auth_headers):
+    """Test that deactivating a user evicts them from the user cache"""
+    assert client.get("/auth/me", headers=auth_headers).status_code == 200
+
+    crud.set_user_active(db_session, test_user["username"], is_active=False)
+
+    response = client.get("/auth/me", headers=auth_headers)
+    assert response.status_code == 400
+    assert "inactive" in response.json()["detail"].lower()
+
+
+def test_token_user_claims(client, test_user, monkeypatch):
+    """Test that tokens with user claims authorize writes without a lookup"""
+    monkeypatch.setattr(auth, "TOKEN_USER_CLAIMS", True)
+    login_data = {"username": test_user["username"], "password": test_user["password"]}
+    token = client.post("/auth/login", data=login_data).json()["access_token"]
+
+    claims = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    assert claims["sub"] == test_user["username"]
+    assert claims["active"] is True
+    assert "uid" in claims
+
+    before = client.get("/metrics/cache").json()["users"]
+    product_data = {"name": "Claims Product", "price": 9.99, "stock": 3}
+    response = client.post(
+        "/products", json=product_data, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 201
+
+    after = client.get("/metrics/cache").json()["users"]
+    assert (after["hits"], after["misses"]) == (before["hits"], before["misses"])
+
+
+def test_password_hasher_process_pool():
+    """Test hashing and verifying through worker processes"""
+    hasher = PasswordHasher(workers=1, queue_limit=1)
+    try:
+        hashed = asyncio.run(hasher.hash("s3cret-pass"))
+        assert asyncio.run(hasher.verify("s3cret-pass", hashed)) is True
+        assert asyncio.run(hasher.verify("wrong-pass", hashed)) is False
+    finally:
+        hasher.shutdown()
+
+
+def test_password_hasher_respawns_a_broken_pool():
+    """Test that hashing recovers after a worker process dies"""
+    hasher = PasswordHasher(workers=1, queue_limit=1)
+    try:
+        hashed = asyncio.run(hasher.hash("s3cret-pass"))
+        # Kill the worker, as the OOM killer would
+        for process in list(hasher._pool._processes.values()):
+            process.kill()
+            process.join()
+
+        # The dead worker may surface on submit (retried on a new pool) or on
+        # the call in flight (which fails, and the pool is replaced)
+        try:
+            asyncio.run(hasher.verify("s3cret-pass", hashed))
+        except BrokenProcessPool:
+            pass
+        assert asyncio.run(hasher.verify("s3cret-pass", hashed)) is True
+        # No slot was leaked on the failed calls
+        slots = hasher.workers + hasher.queue_limit
+        assert all(hasher._slots.acquire(blocking=False) for _ in range(slots))
+        for _ in range(slots):
+            hasher._slots.release()
+    finally:
+        hasher.shutdown()
+
+
+def test_login_rejected_when_hashing_pool_is_full(client, test_user, monkeypatch):
+    """Test that logins get a 503 instead of queueing behind a full pool"""
+    hasher = PasswordHasher(workers=0, queue_limit=1)
+    monkeypatch.setattr(auth_router, "password_hasher", hasher)
+    hasher._slots.acquire()  # the only slot is taken by another login
+
+    login_data = {"username": test_user["username"], "password": test_user["password"]}
+    response = client.post("/auth/login", data=login_data)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    hasher._slots.release()
+    assert client.post("/auth/login", data=login_data).status_code == 200
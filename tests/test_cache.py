@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app import schemas
+from app.cache import LRUCache, RedisCache, SchemaCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Just enough of the redis-py client API for RedisCache"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match.rstrip("*"))]
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that the LRU drops the entry that was used longest ago"""
+    cache = LRUCache(max_size=2)
+    cache.set("a", "1", ttl=60)
+    cache.set("b", "2", ttl=60)
+    cache.get("a")
+    cache.set("c", "3", ttl=60)
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_lru_cache_expires_entries():
+    """Test that entries are dropped once their TTL has passed"""
+    clock = FakeClock()
+    cache = LRUCache(max_size=10, clock=clock)
+    cache.set("a", "1", ttl=5)
+
+    clock.now = 4.9
+    assert cache.get("a") == "1"
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_product_cache_on_redis_backend():
+    """Test the product cache against a Redis-like backend"""
+    cache = SchemaCache(schemas.Product, "product", "id", RedisCache(FakeRedis()), 30)
+    product = schemas.Product(id=1, name="Cached Thing", price=3.5, stock=4)
+
+    assert cache.get(1) is None
+    cache.set(product)
+    assert cache.get(1) == product
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_set_skips_rows_read_before_an_invalidation():
+    """Test that a row read before an invalidation is not cached after it"""
+    cache = SchemaCache(schemas.Product, "product", "id", LRUCache(max_size=10), 30)
+    stale = schemas.Product(id=1, name="Cached Thing", price=3.5, stock=4)
+
+    version = cache.version(1)
+    # A stock change commits and invalidates between the read and the set
+    cache.invalidate(1)
+    cache.set(stale, version)
+    assert cache.get(1) is None
+
+    version = cache.version(1)
+    cache.set(stale, version)
+    assert cache.get(1) == stale
+
+
+def test_cache_counts_every_lookup_across_threads():
+    """Test that hits and misses from concurrent lookups are all counted"""
+    cache = SchemaCache(schemas.Product, "product", "id", LRUCache(max_size=10), 30)
+    cache.set(schemas.Product(id=1, name="Cached Thing", price=3.5, stock=4))
+
+    def lookups(_):
+        for _ in range(1000):
+            cache.get(1)
+            cache.get(2)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lookups, range(8)))
+
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (8000, 8000)
+
+
+def test_invalidation_versions_stay_within_the_cache_size():
+    """Test that versions of invalidated keys are evicted like values"""
+    backend = LRUCache(max_size=10)
+    cache = SchemaCache(schemas.Product, "product", "id", backend, 30)
+    product = schemas.Product(id=1, name="Cached Thing", price=3.5, stock=4)
+
+    version = cache.version(1)
+    cache.invalidate(1)
+    cache.invalidate(*range(2, 1000))
+    assert len(backend) == 10
+
+    # Key 1's version was evicted; the read from before is still stale
+    cache.set(product, version)
+    assert cache.get(1) is None
@@ -0,0 +1,131 @@
+import asyncio
+
+from app.events import EventBus, stock_events
+from app.main import app
+from app.schemas import StockEvent
+
+
+def collect_events(action):
+    """Run ``action`` in a worker thread while subscribed to stock events"""
+
+    async def run():
+        with stock_events.subscribe() as subscription:
+            await asyncio.to_thread(action)
+            events = []
+            while True:
+                try:
+                    events.append(await asyncio.wait_for(subscription.get(), 0.1))
+                except asyncio.TimeoutError:
+                    return events
+
+    return asyncio.run(run())
+
+
+def test_stock_changes_publish_crossings(client, auth_headers, test_product):
+    """Test that orders, cancellations and updates report threshold crossings"""
+    product_id = test_product["id"]
+    order_data = {
+        "customer_name": "Event Customer",
+        "customer_email": "events@example.com",
+        "customer_address": "1 Event St, City, State 12345",
+        "items": [{"product_id": product_id, "quantity": 95}],
+    }
+    responses = []
+
+    def place_order():
+        responses.append(client.post("/orders", json=order_data, headers=auth_headers))
+
+    events = collect_events(place_order)
+    assert [(e.event, e.product_id, e.stock) for e in events] == [
+        ("low_stock", product_id, 5)
+    ]
+
+    order_id = responses[0].json()["id"]
+    events = collect_events(
+        lambda: client.delete(f"/orders/{order_id}/cancel", headers=auth_headers)
+    )
+    assert [(e.event, e.stock) for e in events] == [("restocked", 100)]
+
+    # A threshold change can cross too, and a change that doesn't is silent
+    events = collect_events(
+        lambda: client.patch(
+            f"/products/{product_id}",
+            json={"low_stock_threshold": 100},
+            headers=auth_headers,
+        )
+    )
+    assert [e.event for e in events] == ["low_stock"]
+    events = collect_events(
+        lambda: client.patch(
+            f"/products/{product_id}", json={"price": 1.00}, headers=auth_headers
+        )
+    )
+    assert events == []
+
+
+def test_slow_subscriber_loses_oldest_events():
+    """Test that a full subscriber queue drops its oldest events"""
+    bus = EventBus(queue_size=2)
+
+    async def run():
+        with bus.subscribe() as subscription:
+            for i in range(3):
+                bus.publish(i)
+            await asyncio.sleep(0)
+            return [await subscription.get() for _ in range(2)], subscription
+
+    received, subscription = asyncio.run(run())
+    assert received == [1, 2]
+    assert subscription.take_dropped() == 1
+    assert bus.subscriber_count == 0
+
+
+def test_low_stock_event_stream():
+    """Test that the SSE endpoint streams published events"""
+
+    async def read_stream():
+        body = b""
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal body
+            if message["type"] == "http.response.start":
+                assert (b"content-type", b"text/event-stream; charset=utf-8") in (
+                    message["headers"]
+                )
+            body += message.get("body", b"")
+            if b"event:" in body:
+                disconnected.set()
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/events/low-stock",
+            "raw_path": b"/events/low-stock",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+            "server": ("testserver", 80),
+            "client": ("testclient", 50000),
+        }
+        stream = asyncio.create_task(app(scope, receive, send))
+        while stock_events.subscriber_count == 0:
+            await asyncio.sleep(0.01)
+        stock_events.publish(
+            StockEvent(event="low_stock", product_id=7, stock=2, low_stock_threshold=5)
+        )
+        await asyncio.wait_for(stream, 5)
+        return body.decode()
+
+    body = asyncio.run(read_stream())
+    assert body.startswith(": subscribed")
+    assert "event: low_stock\n" in body
+    assert '"product_id":7' in body
+    assert stock_events.subscriber_count == 0
@@ -0,0 +1,80 @@
+import logging
+
+from fastapi.testclient import TestClient
+
+from app.instrumentation import QUERIES_PER_CALL, REQUEST_LATENCY, QueryBudgetMiddleware
+from app.main import app
+from app.metrics import Counter, Histogram, Registry
+
+
+def test_registry_renders_prometheus_text():
+    """Test the text exposition format for counters and histograms"""
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests", ["path"]))
+    latency = registry.register(
+        Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    )
+
+    requests.inc(path='/a"b')
+    requests.inc(2, path='/a"b')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{path="/a\\"b"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_sum 5.55" in lines
+    assert "latency_seconds_count 3" in lines
+
+
+def test_metrics_endpoint_reports_routes_and_queries(
+    client, auth_headers, test_product
+):
+    """Test that requests and crud queries show up at /metrics"""
+    calls = QUERIES_PER_CALL.count(operation="create_order")
+    requests = REQUEST_LATENCY.count(method="POST", route="/orders", status=201)
+    order_data = {
+        "customer_name": "Metrics Customer",
+        "customer_email": "metrics@example.com",
+        "customer_address": "1 Metrics St, City, State 12345",
+        "items": [{"product_id": test_product["id"], "quantity": 1}],
+    }
+    client.post("/orders", json=order_data, headers=auth_headers)
+
+    assert QUERIES_PER_CALL.count(operation="create_order") == calls + 1
+    assert (
+        REQUEST_LATENCY.count(method="POST", route="/orders", status=201)
+        == requests + 1
+    )
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'syncstock_db_query_duration_seconds_count{operation="create_order"}' in (
+        response.text
+    )
+    assert 'syncstock_http_requests_in_flight{method="GET"} 1' in response.text
+
+
+def test_async_queries_are_attributed(async_client):
+    """Test that queries run through AsyncSession.run_sync keep their operation"""
+    calls = QUERIES_PER_CALL.count(operation="get_products")
+
+    async_client.get("/products")
+
+    assert QUERIES_PER_CALL.count(operation="get_products") == calls + 1
+
+
+def test_query_budget_middleware_warns(client, test_product, caplog):
+    """Test that requests over the query budget are logged"""
+    with TestClient(QueryBudgetMiddleware(app, budget=0)) as budget_client:
+        with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+            budget_client.get("/products")
+            budget_client.get("/")
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ["GET /products ran 1 SQL statements (budget 0)"]
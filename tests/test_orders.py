@@ -1,3 +1,12 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app import crud, export, models, schemas
+
+
 def test_create_order(client, auth_headers, test_product):
     """Test creating an order"""
     order_data = {
@@ -124,6 +133,11 @@ def test_get_order_by_id(client, auth_headers, test_product):
     assert data["customer_name"] == order_data["customer_name"]
     assert len(data["items"]) == 1
 
+    # Listings are encoded from rows with orjson, bypassing response_model
+    assert client.get("/orders").json() == [data]
+    filtered = client.get("/orders/filter?customer_email=specific@example.com")
+    assert filtered.json() == [data]
+
 
 def test_update_order_status(client, auth_headers, test_product):
     """Test updating order status"""
@@ -173,6 +187,62 @@ def test_cancel_order(client, auth_headers, test_product):
     updated_product = product_response.json()
     assert updated_product["stock"] == initial_stock
 
+    # Cancelling again must not restore the stock a second time
+    response = client.delete(f"/orders/{order_id}/cancel", headers=auth_headers)
+    assert response.status_code == 200
+    assert (
+        client.get(f"/products/{test_product['id']}").json()["stock"] == initial_stock
+    )
+
+
+def test_cancel_orders_in_bulk(client, auth_headers, test_product):
+    """Test cancelling many orders at once"""
+    other = client.post(
+        "/products",
+        json={"name": "Other Product", "price": 5.00, "stock": 20},
+        headers=auth_headers,
+    ).json()
+
+    order_ids = []
+    for i in range(4):
+        order_data = {
+            "customer_name": f"Bulk Customer {i}",
+            "customer_email": f"bulk{i}@example.com",
+            "customer_address": f"{i} Bulk St, City, State 12345",
+            "items": [
+                {"product_id": test_product["id"], "quantity": 2},
+                {"product_id": other["id"], "quantity": 1},
+            ],
+        }
+        response = client.post("/orders", json=order_data, headers=auth_headers)
+        order_ids.append(response.json()["id"])
+
+    delivered, cancelled = order_ids[0], order_ids[1]
+    client.patch(
+        f"/orders/{delivered}/status",
+        json={"status": "delivered"},
+        headers=auth_headers,
+    )
+    client.delete(f"/orders/{cancelled}/cancel", headers=auth_headers)
+
+    response = client.post(
+        "/orders/cancel",
+        json={"order_ids": order_ids + [99999]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "cancelled": order_ids[2:],
+        "already_cancelled": [cancelled],
+        "not_cancellable": [delivered],
+        "not_found": [99999],
+    }
+    # Only the delivered order still holds stock
+    assert client.get(f"/products/{test_product['id']}").json()["stock"] == 98
+    assert client.get(f"/products/{other['id']}").json()["stock"] == 19
+    assert client.get(f"/orders/{order_ids[2]}").json()["status"] == "cancelled"
+
 
 def test_filter_orders_by_status(client, auth_headers, test_product):
     """Test filtering orders by status"""
@@ -191,3 +261,240 @@ def test_filter_orders_by_status(client, auth_headers, test_product):
     assert response.status_code == 200
     data = response.json()
     assert all(order["status"] == "pending" for order in data)
+
+
+def test_orders_cursor_pagination(client, auth_headers, test_product):
+    """Test walking order history with keyset cursors"""
+    for i in range(5):
+        order_data = {
+            "customer_name": f"Cursor Customer {i}",
+            "customer_email": f"cursor{i}@example.com",
+            "customer_address": f"{i} Cursor St, City, State 12345",
+            "items": [{"product_id": test_product["id"], "quantity": 1}],
+        }
+        client.post("/orders", json=order_data, headers=auth_headers)
+
+    seen = []
+    response = client.get("/orders/filter?status=pending&limit=2")
+    while True:
+        assert response.status_code == 200
+        seen.extend(order["id"] for order in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = client.get(f"/orders/filter?status=pending&limit=2&cursor={cursor}")
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+
+def test_export_orders(client, auth_headers, test_product, monkeypatch):
+    """Test that exports stream filtered orders as NDJSON and CSV"""
+    # The second order's item rows straddle two cursor partitions
+    monkeypatch.setattr(export, "EXPORT_PARTITION_SIZE", 3)
+    for email, quantity in [("export@example.com", 2), ("other@example.com", 1)]:
+        order_data = {
+            "customer_name": "Export Customer",
+            "customer_email": email,
+            "customer_address": "1 Export St, City, State 12345",
+            "items": [
+                {"product_id": test_product["id"], "quantity": quantity},
+                {"product_id": test_product["id"], "quantity": 1},
+            ],
+        }
+        client.post("/orders", json=order_data, headers=auth_headers)
+
+    response = client.get("/orders/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == client.get("/orders").json()
+
+    response = client.get(
+        "/orders/export?format=csv&customer_email=export@", headers=auth_headers
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(r["customer_email"], r["quantity"]) for r in rows] == [
+        ("export@example.com", "2"),
+        ("export@example.com", "1"),
+    ]
+
+    assert client.get("/orders/export").status_code == 401
+
+
+def test_create_order_with_repeated_product(client, auth_headers, test_product):
+    """Test that stock is checked against the combined quantity of a product"""
+    order_data = {
+        "customer_name": "Repeat Customer",
+        "customer_email": "repeat@example.com",
+        "customer_address": "222 Repeat St, City, State 12345",
+        "items": [
+            {"product_id": test_product["id"], "quantity": 60},
+            {"product_id": test_product["id"], "quantity": 60},
+        ],
+    }
+    response = client.post("/orders", json=order_data, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert "insufficient stock" in response.json()["detail"].lower()
+
+    product_response = client.get(f"/products/{test_product['id']}")
+    assert product_response.json()["stock"] == test_product["stock"]
+
+
+def test_create_orders_in_batch(client, auth_headers, test_product, query_budget):
+    """Test that a batch creates the orders that fit and reports the rest"""
+
+    def order(quantity, product_id=test_product["id"]):
+        return {
+            "customer_name": "Marketplace Customer",
+            "customer_email": "marketplace@example.com",
+            "customer_address": "1 Marketplace St, City, State 12345",
+            "items": [{"product_id": product_id, "quantity": quantity}],
+        }
+
+    batch = {"orders": [order(60), order(60), order(40), order(1, product_id=99999)]}
+    # Warm the user cache so only order queries are counted
+    client.get("/auth/me", headers=auth_headers)
+    with query_budget(8):
+        response = client.post("/orders/batch", json=batch, headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["failed"]) == (2, 2)
+    first, second, third, fourth = data["results"]
+    assert first["order"]["total_amount"] == 1799.40
+    assert first["order"]["items"][0]["quantity"] == 60
+    assert "available: 40" in second["error"].lower()
+    assert third["order"]["id"] > first["order"]["id"]
+    assert "not found" in fourth["error"]
+    assert [r["index"] for r in data["results"]] == [0, 1, 2, 3]
+
+    product_response = client.get(f"/products/{test_product['id']}")
+    assert product_response.json()["stock"] == 0
+    assert len(client.get("/orders").json()) == 2
+
+
+def test_idempotency_key_replays_order(client, auth_headers, test_product):
+    """Test that a retried Idempotency-Key returns the first order once"""
+    order_data = {
+        "customer_name": "Retry Customer",
+        "customer_email": "retry@example.com",
+        "customer_address": "1 Retry St, City, State 12345",
+        "items": [{"product_id": test_product["id"], "quantity": 2}],
+    }
+    headers = {**auth_headers, "Idempotency-Key": "order-1"}
+
+    first = client.post("/orders", json=order_data, headers=headers)
+    retry = client.post("/orders", json=order_data, headers=headers)
+
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert len(client.get("/orders").json()) == 1
+    product_response = client.get(f"/products/{test_product['id']}")
+    assert product_response.json()["stock"] == test_product["stock"] - 2
+
+    order_data["items"][0]["quantity"] = 3
+    response = client.post("/orders", json=order_data, headers=headers)
+    assert response.status_code == 422
+
+
+def test_expired_idempotency_key_is_reused(
+    client, auth_headers, test_product, db_session
+):
+    """Test that an Idempotency-Key past its TTL creates a new order"""
+    order_data = {
+        "customer_name": "Late Customer",
+        "customer_email": "late@example.com",
+        "customer_address": "1 Late St, City, State 12345",
+        "items": [{"product_id": test_product["id"], "quantity": 1}],
+    }
+    headers = {**auth_headers, "Idempotency-Key": "order-2"}
+    first = client.post("/orders", json=order_data, headers=headers)
+
+    db_session.query(models.IdempotencyKey).update({"expires_at": datetime(2000, 1, 1)})
+    db_session.commit()
+
+    second = client.post("/orders", json=order_data, headers=headers)
+    assert second.status_code == 201
+    assert "Idempotent-Replayed" not in second.headers
+    assert second.json()["id"] != first.json()["id"]
+
+
+def test_concurrent_orders_do_not_oversell(concurrent_sessionmaker):
+    """Test that parallel orders for one product never drive stock negative"""
+    setup_db = concurrent_sessionmaker()
+    product = models.Product(
+        name="Hot Item", price=5.0, stock=10, low_stock_threshold=2
+    )
+    setup_db.add(product)
+    setup_db.commit()
+    product_id = product.id
+    setup_db.close()
+
+    order = schemas.OrderCreate(
+        customer_name="Rush Customer",
+        customer_email="rush@example.com",
+        customer_address="1 Rush St, City, State 12345",
+        items=[{"product_id": product_id, "quantity": 1}],
+    )
+
+    def place_order(_):
+        db = concurrent_sessionmaker()
+        try:
+            crud.create_order(db, order=order)
+            return True
+        except ValueError:
+            return False
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(place_order, range(25)))
+
+    check_db = concurrent_sessionmaker()
+    try:
+        assert results.count(True) == 10
+        assert crud.get_product(check_db, product_id=product_id).stock == 0
+        assert check_db.query(models.Order).count() == 10
+    finally:
+        check_db.close()
+
+
+def test_order_queries_do_not_grow_with_items(client, auth_headers, query_budget):
+    """Test that creating and cancelling orders runs a fixed number of queries"""
+    product_ids = []
+    for i in range(10):
+        product_data = {"name": f"Budget Product {i}", "price": 1.00, "stock": 10}
+        response = client.post("/products", json=product_data, headers=auth_headers)
+        product_ids.append(response.json()["id"])
+    # Warm the user cache so only order queries are counted
+    client.get("/auth/me", headers=auth_headers)
+
+    counts = []
+    for size in (1, 10):
+        order_data = {
+            "customer_name": "Budget Customer",
+            "customer_email": "budget@example.com",
+            "customer_address": "1 Budget St, City, State 12345",
+            "items": [
+                {"product_id": product_id, "quantity": 1}
+                for product_id in product_ids[:size]
+            ],
+        }
+        with query_budget(7) as create_queries:
+            response = client.post("/orders", json=order_data, headers=auth_headers)
+        with query_budget(8) as cancel_queries:
+            client.delete(
+                f"/orders/{response.json()['id']}/cancel", headers=auth_headers
+            )
+        counts.append((create_queries.count, cancel_queries.count))
+
+    assert counts[0] == counts[1]
+
+    with query_budget(2):
+        client.get("/orders")
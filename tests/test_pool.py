@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app.pool import MeteredQueuePool, engine_options, instrument, pool_metrics
+
+
+@pytest.fixture
+def metered_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=MeteredQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.2,
+    )
+    instrument(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_engine_options():
+    """Test that server databases get a configured, metered pool"""
+    assert engine_options("sqlite://") == {}
+
+    options = engine_options("postgresql://user:password@db/syncstock")
+    assert options["poolclass"] is MeteredQueuePool
+    assert {"pool_size", "max_overflow", "pool_timeout", "pool_recycle"} <= set(options)
+
+
+def test_pool_metrics_track_overflow_waits_and_timeouts(metered_engine):
+    """Test the pool counters under contention"""
+    first = metered_engine.connect()
+    second = metered_engine.connect()  # the one overflow connection
+
+    metrics = pool_metrics(metered_engine)
+    assert metrics["checked_out"] == 2
+    assert metrics["overflow"] == 1
+    assert metrics["overflow_peak"] == 1
+
+    with pytest.raises(exc.TimeoutError):
+        metered_engine.connect()
+
+    # A checkout that has to wait for another to be returned
+    threading.Timer(0.05, second.close).start()
+    with metered_engine.connect() as third:
+        third.execute(text("SELECT 1"))
+    first.close()
+
+    metrics = pool_metrics(metered_engine)
+    assert metrics["timeouts"] == 1
+    assert metrics["waits"] >= 1
+    assert metrics["wait_seconds_max"] >= 0.04
+    assert metrics["checkouts"] == 3
+    assert metrics["connects"] == 2
+    assert metrics["checked_out"] == 0
+
+
+def test_new_connections_do_not_count_as_waits(tmp_path):
+    """Test that the time spent opening a connection is not a pool wait"""
+
+    def slow_connect():
+        time.sleep(0.05)  # e.g. TCP, TLS and authentication to the server
+        return sqlite3.connect(tmp_path / "pool.db", check_same_thread=False)
+
+    engine = create_engine(
+        "sqlite://", creator=slow_connect, poolclass=MeteredQueuePool, pool_size=1
+    )
+    instrument(engine)
+    try:
+        first = engine.connect()
+        second = engine.connect()  # an overflow connection, also opened fresh
+        first.close()
+        second.close()
+        engine.connect().close()  # reuses a pooled connection
+
+        metrics = pool_metrics(engine)
+        assert metrics["checkouts"] == 3
+        assert metrics["waits"] == 0
+        assert metrics["wait_seconds_max"] == 0.0
+    finally:
+        engine.dispose()
+
+
+def test_pool_stats_survive_dispose(metered_engine):
+    """Test that engine.dispose() keeps the counters"""
+    metered_engine.connect().close()
+    metered_engine.dispose()
+    metered_engine.connect().close()
+
+    assert pool_metrics(metered_engine)["checkouts"] == 2
+
+
+def test_pool_metrics_endpoint(client):
+    """Test the pool metrics endpoint"""
+    response = client.get("/metrics/pool")
+
+    assert response.status_code == 200
+    assert "pool" in response.json()["primary"]
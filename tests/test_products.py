@@ -1,3 +1,12 @@
+import json
+
+import pytest
+from sqlalchemy import event, text
+
+from app import crud, export, models, schemas
+from app.cache import product_cache
+
+
 def test_create_product(client, auth_headers):
     """Test creating a product"""
     product_data = {
@@ -30,6 +39,14 @@ def test_create_product_without_auth(client):
     assert response.status_code == 401
 
 
+def test_create_product_rejects_fractional_cents(client, auth_headers):
+    """Test that prices are limited to whole cents"""
+    product_data = {"name": "New Product", "price": 9.999, "stock": 5}
+    response = client.post("/products", json=product_data, headers=auth_headers)
+
+    assert response.status_code == 422
+
+
 def test_get_all_products(client, test_product):
     """Test getting all products"""
     response = client.get("/products")
@@ -120,6 +137,47 @@ def test_low_stock_products(client, auth_headers):
     assert all(p["stock"] <= p["low_stock_threshold"] for p in data)
 
 
+def test_low_stock_pagination_tracks_stock(client, auth_headers):
+    """Test paging low-stock products as stock moves in and out of range"""
+    ids = []
+    for i in range(5):
+        product_data = {"name": f"Low Item {i}", "price": 1.00, "stock": i}
+        response = client.post("/products", json=product_data, headers=auth_headers)
+        ids.append(response.json()["id"])
+    client.patch(
+        "/products/stock",
+        json=[{"product_id": ids[1], "absolute": 500}],
+        headers=auth_headers,
+    )
+
+    first_page = client.get("/products/low-stock?limit=2")
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = client.get(f"/products/low-stock?limit=2&cursor={cursor}")
+
+    assert [p["id"] for p in first_page.json()] == [ids[0], ids[2]]
+    assert [p["id"] for p in second_page.json()] == [ids[3], ids[4]]
+
+
+def test_low_stock_query_uses_partial_index(db_session):
+    """Test that the low-stock listing reads the partial index on SQLite"""
+    if db_session.get_bind().dialect.name != "sqlite":
+        pytest.skip("Query plan check is written for SQLite")
+
+    query = db_session.query(models.Product).filter(
+        models.Product.stock <= models.Product.low_stock_threshold
+    )
+    sql = (
+        query.order_by(models.Product.id)
+        .limit(10)
+        .statement.compile(
+            db_session.get_bind(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    plan = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+
+    assert any("ix_products_low_stock" in row[-1] for row in plan)
+
+
 def test_pagination(client, auth_headers):
     """Test product pagination"""
     # Create 5 products
@@ -143,3 +201,285 @@ def test_pagination(client, auth_headers):
     assert response.status_code == 200
     data = response.json()
     assert len(data) == 2
+
+
+def test_cursor_pagination(client, auth_headers):
+    """Test walking the product list with keyset cursors"""
+    for i in range(5):
+        product_data = {
+            "name": f"Cursor Product {i}",
+            "price": 10.00 + i,
+            "stock": 10,
+            "low_stock_threshold": 5,
+        }
+        client.post("/products", json=product_data, headers=auth_headers)
+
+    seen = []
+    response = client.get("/products?limit=2")
+    while True:
+        assert response.status_code == 200
+        seen.extend(p["id"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = client.get(f"/products?limit=2&cursor={cursor}")
+
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+
+def test_search_cursor_pagination(client, auth_headers):
+    """Test that search results can be paged with a cursor"""
+    for name in ["Cursor Shirt A", "Cursor Shirt B", "Cursor Shirt C", "Cursor Hat"]:
+        product_data = {"name": name, "price": 15.00, "stock": 5}
+        client.post("/products", json=product_data, headers=auth_headers)
+
+    first_page = client.get("/products/search?search=Shirt&limit=2")
+    assert len(first_page.json()) == 2
+    cursor = first_page.headers["X-Next-Cursor"]
+
+    second_page = client.get(f"/products/search?search=Shirt&limit=2&cursor={cursor}")
+    assert second_page.status_code == 200
+    assert len(second_page.json()) == 1
+    assert "X-Next-Cursor" not in second_page.headers
+
+    names = [p["name"] for p in first_page.json() + second_page.json()]
+    assert sorted(names) == ["Cursor Shirt A", "Cursor Shirt B", "Cursor Shirt C"]
+
+
+def test_search_ranks_closest_match_first(client, auth_headers):
+    """Test that search results are ordered by relevance"""
+    for name in ["Shirt Hanger Deluxe Edition", "Shirt", "Blue Shirt"]:
+        product_data = {"name": name, "price": 5.00, "stock": 5}
+        client.post("/products", json=product_data, headers=auth_headers)
+
+    response = client.get("/products/search?search=shirt")
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == [
+        "Shirt",
+        "Blue Shirt",
+        "Shirt Hanger Deluxe Edition",
+    ]
+    assert set(response.json()[0]) == set(schemas.Product.model_fields)
+
+
+def test_search_index_tracks_product_changes(client, auth_headers, test_product):
+    """Test that renamed and deleted products leave the search index"""
+    response = client.get("/products/search?search=Test")
+    assert [p["id"] for p in response.json()] == [test_product["id"]]
+
+    client.patch(
+        f"/products/{test_product['id']}",
+        json={"name": "Renamed Gadget"},
+        headers=auth_headers,
+    )
+    assert client.get("/products/search?search=Test").json() == []
+    assert len(client.get("/products/search?search=gadget").json()) == 1
+
+    client.delete(f"/products/{test_product['id']}", headers=auth_headers)
+    assert client.get("/products/search?search=gadget").json() == []
+
+
+def test_invalid_cursor(client):
+    """Test that a malformed cursor is rejected"""
+    response = client.get("/products?cursor=not-a-cursor")
+
+    assert response.status_code == 400
+
+
+def test_get_product_is_cached(client, test_product):
+    """Test that repeated reads of a product are served from the cache"""
+    client.get(f"/products/{test_product['id']}")
+    before = client.get("/metrics/cache").json()["products"]
+
+    response = client.get(f"/products/{test_product['id']}")
+    assert response.status_code == 200
+    assert response.json()["name"] == test_product["name"]
+
+    after = client.get("/metrics/cache").json()["products"]
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+
+def test_product_cache_sees_updates(client, auth_headers, test_product):
+    """Test that writes replace the cached product"""
+    client.get(f"/products/{test_product['id']}")
+    client.patch(
+        f"/products/{test_product['id']}", json={"stock": 7}, headers=auth_headers
+    )
+
+    response = client.get(f"/products/{test_product['id']}")
+    assert response.json()["stock"] == 7
+
+
+def test_product_read_racing_a_stock_change_is_not_cached(db_session, test_product):
+    """Test that a row read before a stock change's invalidation is not cached"""
+    product_id = test_product["id"]
+    product_cache.invalidate(product_id)  # start from a cache miss
+
+    def stock_change_commits(orm_execute_state):
+        # Another request commits a stock change and invalidates the product
+        # after this read has seen the old row
+        product_cache.invalidate(product_id)
+
+    event.listen(db_session, "do_orm_execute", stock_change_commits)
+    try:
+        assert crud.get_product(db_session, product_id).stock == test_product["stock"]
+    finally:
+        event.remove(db_session, "do_orm_execute", stock_change_commits)
+
+    assert product_cache.get(product_id) is None
+    crud.get_product(db_session, product_id)
+    assert product_cache.get(product_id) is not None
+
+
+def test_bulk_import_ndjson(client, auth_headers, test_product):
+    """Test upserting products from NDJSON with a per-row error report"""
+    lines = [
+        {"name": "Bulk Item 1", "price": 1.50, "stock": 10},
+        {"name": test_product["name"], "price": 99.00, "stock": 1},
+        {"name": "Bulk Item 2", "price": -5, "stock": 10},
+        "not json",
+        {"name": "Bulk Item 3", "price": 3.00, "stock": 30, "low_stock_threshold": 2},
+    ]
+    body = "\n".join(
+        line if isinstance(line, str) else json.dumps(line) for line in lines
+    )
+
+    def stream():
+        # Split mid-line to make sure rows are reassembled across chunks
+        for start in range(0, len(body), 7):
+            yield body[start : start + 7].encode()
+
+    response = client.post(
+        "/products/bulk",
+        content=stream(),
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 2
+    assert result["updated"] == 1
+    assert result["failed"] == 2
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+    assert "price" in result["errors"][0]["errors"][0]
+
+    updated = client.get(f"/products/{test_product['id']}").json()
+    assert updated["price"] == 99.00
+    assert updated["stock"] == 1
+    assert len(client.get("/products/search?search=Bulk Item").json()) == 2
+
+
+def test_bulk_import_csv(client, auth_headers):
+    """Test importing products from CSV, with empty cells using defaults"""
+    body = (
+        "name,price,stock,low_stock_threshold\n"
+        "CSV Widget,4.25,40,\n"
+        '"CSV Gadget, Large",8.00,5,3\n'
+        "CSV Broken,abc,1,1\n"
+    )
+    response = client.post(
+        "/products/bulk?format=csv", content=body.encode(), headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["inserted"], result["updated"], result["failed"]) == (2, 0, 1)
+    assert result["errors"][0]["line"] == 4
+
+    products = {p["name"]: p for p in client.get("/products").json()}
+    assert products["CSV Widget"]["low_stock_threshold"] == 10
+    assert products["CSV Gadget, Large"]["low_stock_threshold"] == 3
+
+
+def test_bulk_import_requires_auth(client):
+    """Test that bulk import requires authentication"""
+    response = client.post("/products/bulk", content=b"{}")
+
+    assert response.status_code == 401
+
+
+def test_export_products(client, auth_headers, test_product, monkeypatch):
+    """Test that the product export streams every product in id order"""
+    # Several cursor partitions, so rows are encoded across chunks
+    monkeypatch.setattr(export, "EXPORT_PARTITION_SIZE", 2)
+    for i in range(4):
+        product_data = {"name": f"Export Product {i}", "price": 1.50, "stock": i}
+        client.post("/products", json=product_data, headers=auth_headers)
+    products = client.get("/products").json()
+
+    response = client.get("/products/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].endswith('"products.ndjson"')
+    assert [json.loads(line) for line in response.text.splitlines()] == products
+
+    response = client.get("/products/export?format=csv", headers=auth_headers)
+    lines = response.text.splitlines()
+    assert lines[0] == "id,name,price,stock,low_stock_threshold"
+    assert lines[1] == f"{test_product['id']},Test Product,29.99,100,10"
+    assert len(lines) == len(products) + 1
+
+
+def test_adjust_stock(client, auth_headers, test_product):
+    """Test batch stock changes with threshold crossings reported"""
+    low = client.post(
+        "/products",
+        json={
+            "name": "Low Product",
+            "price": 5.00,
+            "stock": 2,
+            "low_stock_threshold": 5,
+        },
+        headers=auth_headers,
+    ).json()
+    client.get(f"/products/{test_product['id']}")  # cache it
+
+    response = client.patch(
+        "/products/stock",
+        json=[
+            {"product_id": test_product["id"], "delta": -95},
+            {"product_id": low["id"], "absolute": 50},
+            {"product_id": low["id"], "delta": -1},
+        ],
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    levels = {p["product_id"]: p["stock"] for p in result["products"]}
+    assert levels == {test_product["id"]: 5, low["id"]: 49}
+    assert result["low_stock"] == [test_product["id"]]
+    assert result["restocked"] == [low["id"]]
+    assert client.get(f"/products/{test_product['id']}").json()["stock"] == 5
+
+
+def test_adjust_stock_is_all_or_nothing(client, auth_headers, test_product):
+    """Test that one invalid entry rejects the whole batch"""
+    response = client.patch(
+        "/products/stock",
+        json=[
+            {"product_id": test_product["id"], "delta": 5},
+            {"product_id": 99999, "delta": 1},
+        ],
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+
+    response = client.patch(
+        "/products/stock",
+        json=[
+            {"product_id": test_product["id"], "delta": 5},
+            {"product_id": test_product["id"], "delta": -200},
+        ],
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+    assert client.get(f"/products/{test_product['id']}").json()["stock"] == 100
+
+    response = client.patch(
+        "/products/stock",
+        json=[{"product_id": test_product["id"], "delta": 1, "absolute": 1}],
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models
+from app.database import Base
+
+
+@pytest.fixture
+def replica_sessionmaker(tmp_path, monkeypatch):
+    """Route read-only endpoints to a second SQLite database.
+
+    Nothing is replicated, so rows written through the API only exist on the
+    primary and rows written here only exist on the replica.
+    """
+    replica_engine = create_engine(
+        f"sqlite:///{tmp_path / 'replica.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(bind=replica_engine)
+    replica_sessionmaker = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine
+    )
+    monkeypatch.setattr(database, "ReplicaSessionLocal", replica_sessionmaker)
+    yield replica_sessionmaker
+    replica_engine.dispose()
+
+
+def test_listings_read_from_replica(
+    client, auth_headers, test_product, replica_sessionmaker
+):
+    """Test that listings use the replica and writes use the primary"""
+    with replica_sessionmaker() as db:
+        db.add(models.Product(name="Replica Product", price=1.00, stock=1))
+        db.commit()
+
+    response = client.get("/products")
+    assert [p["name"] for p in response.json()] == ["Replica Product"]
+    response = client.get("/products/search?search=Product")
+    assert [p["name"] for p in response.json()] == ["Replica Product"]
+
+    # Single-product reads stay on the primary, next to the cache they fill
+    response = client.get(f"/products/{test_product['id']}")
+    assert response.json()["name"] == test_product["name"]
+
+    order_data = {
+        "customer_name": "Primary Customer",
+        "customer_email": "primary@example.com",
+        "customer_address": "1 Primary St, City, State 12345",
+        "items": [{"product_id": test_product["id"], "quantity": 1}],
+    }
+    response = client.post("/orders", json=order_data, headers=auth_headers)
+    assert response.status_code == 201
+    order_id = response.json()["id"]
+    assert client.get("/orders").json() == []
+    response = client.get("/orders", headers={"X-Read-Primary": "true"})
+    assert len(response.json()) == 1
+
+    # Fetching the order just placed reads the primary too
+    response = client.get(f"/orders/{order_id}")
+    assert response.status_code == 200
+    assert response.json()["customer_name"] == "Primary Customer"
+
+
+def test_read_primary_header(client, test_product, replica_sessionmaker):
+    """Test that X-Read-Primary gives read-your-writes on listings"""
+    headers = {"X-Read-Primary": "true"}
+
+    response = client.get("/products", headers=headers)
+    assert [p["id"] for p in response.json()] == [test_product["id"]]
+
+
+def test_search_index_keeps_writes_the_replica_lacks(
+    client, auth_headers, replica_sessionmaker
+):
+    """Test that a product missing from the replica when the search index is
+    built from it is still indexed once the replica catches up"""
+    product_data = {"name": "Lagging Gadget", "price": 5.00, "stock": 3}
+    response = client.post("/products", json=product_data, headers=auth_headers)
+    product_id = response.json()["id"]
+
+    # The first search builds the index from the replica, which lags
+    assert client.get("/products/search?search=Gadget").json() == []
+
+    with replica_sessionmaker() as db:
+        db.add(models.Product(id=product_id, **product_data))
+        db.commit()
+
+    response = client.get("/products/search?search=Gadget")
+    assert [p["id"] for p in response.json()] == [product_id]